@@ -0,0 +1,59 @@
+#!/usr/bin/python
+# coding: utf-8
+'''
+Micro-benchmark of the per-access cost of Identifier constants such as
+BookID._GENESIS.
+
+The "before" figure comes from a replica of the original implementation in
+which every constant was a property that looked its own name up with
+inspect.currentframe(). The "after" figure uses the Identifiers exported by
+bibleutils.versification.
+
+Usage: python -m benchmarks.bench_identifiers [-n NUMBER]
+'''
+import argparse
+from inspect import currentframe
+import timeit
+
+from bibleutils.versification import BookID, VersificationID, ReferenceFormID
+
+class _FrameLookupID(object):
+    '''Replica of the original property based Identifier.'''
+    def __init__(self):
+        self._map = {'_GENESIS' : 1, 'ETCBCH' : 1, 'BIBLEUTILS' : 0}
+
+    @property
+    def _GENESIS(self):
+        return self._map.get(currentframe().f_code.co_name)
+
+    @property
+    def ETCBCH(self):
+        return self._map.get(currentframe().f_code.co_name)
+
+    @property
+    def BIBLEUTILS(self):
+        return self._map.get(currentframe().f_code.co_name)
+
+def _per_access_ns(stmt, namespace, number):
+    best = min(timeit.repeat(stmt, globals=namespace, number=number, repeat=5))
+    return best / number * 1e9
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Time access to Identifier constants')
+    parser.add_argument('-n', '--number', type=int, default=1000000,
+                        help='accesses per timing run')
+    args = parser.parse_args(argv)
+    
+    legacy = _FrameLookupID()
+    cases = [('BookID._GENESIS', 'x._GENESIS', BookID),
+             ('VersificationID.ETCBCH', 'x.ETCBCH', VersificationID),
+             ('ReferenceFormID.BIBLEUTILS', 'x.BIBLEUTILS', ReferenceFormID)]
+    print(f'{"constant":<28}{"before ns":>12}{"after ns":>12}{"speedup":>10}')
+    for (name, stmt, current) in cases:
+        before = _per_access_ns(stmt, {'x' : legacy}, args.number)
+        after = _per_access_ns(stmt, {'x' : current}, args.number)
+        print(f'{name:<28}{before:>12.1f}{after:>12.1f}{before / after:>9.1f}x')
+
+if __name__ == '__main__':
+    main()
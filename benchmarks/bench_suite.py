@@ -0,0 +1,233 @@
+#!/usr/bin/python
+# coding: utf-8
+'''
+Throughput benchmarks of the main reference operations over synthetic
+corpora. See benchmarks.corpus.
+
+Each case is run over corpora of each requested size and reports:
+
+  ops/sec     - calls per second over the whole corpus, the best of
+                --repeat runs.
+  latency     - percentiles of the time of single calls, timed individually
+                over at most --latency-sample calls.
+  peak memory - the peak memory allocated, as traced by tracemalloc, while
+                keeping the results of at most --memory-sample calls.
+
+Results may be saved as JSON and compared with a previous run. Any case whose
+ops/sec fell by more than the threshold is reported as a regression and the
+exit status is 1. The noise of each case, the spread of its throughput runs,
+is saved with it. The larger noise of the two runs widens the threshold by
+at most the threshold again, so a noisy run cannot hide a fall of more than
+twice the threshold. Measuring the noise takes at least 3 runs, so
+comparison requires --repeat 3 or more.
+
+Usage: python -m benchmarks.bench_suite [--sizes 1k,100k,10M] [--cases ...]
+           [--repeat N] [--save FILE] [--baseline FILE]
+           [--threshold FRACTION]
+'''
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from bibleutils.versification import BookID, RefParser, ReferenceFormID, \
+     convert_refs, expand_refs, parse_refs
+from benchmarks.corpus import make_corpus, versification_of
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+def _parse_inputs(corpus):
+    return corpus
+
+def _parse_cached_inputs(corpus):
+    # A fresh cache holding every string of the corpus, so that every timed
+    # call is a cache hit
+    parse = RefParser(maxsize=None).parse
+    for s in corpus:
+        parse(s, ReferenceFormID.BIBLEUTILS)
+    return [(parse, s) for s in corpus]
+
+def _book_inputs(corpus):
+    return [s.split(' ', 1)[0].rstrip('.') for s in corpus]
+
+def _refs_inputs(corpus):
+    return [parse_refs(s, ReferenceFormID.BIBLEUTILS) for s in corpus]
+
+def _expand_inputs(corpus):
+    # The refs of multi-book strings in another versification than the first
+    # are dropped, as one versification is used per call
+    rv = []
+    for refs in _refs_inputs(corpus):
+        vf = versification_of(refs[0].st_book)
+        rv.append(([r for r in refs if versification_of(r.st_book) is vf],
+                   vf))
+    return rv
+
+_uncached = RefParser(maxsize=0).parse
+
+# Each case is a tuple of a function building its inputs from the corpus and
+# the operation called once per input
+CASES = {
+    'parse_refs' : (_parse_inputs,
+                    lambda s: _uncached(s, ReferenceFormID.BIBLEUTILS)),
+    'parse_refs_cached' : (_parse_cached_inputs,
+                           lambda x: x[0](x[1], ReferenceFormID.BIBLEUTILS)),
+    'BookID.fromStr' : (_book_inputs, BookID.fromStr),
+    'convert_refs' : (_refs_inputs,
+                      lambda refs: convert_refs(refs, ReferenceFormID.ETCBCH)),
+    'expand_refs' : (_expand_inputs, lambda x: expand_refs(x[0], x[1])),
+}
+
+def parse_size(s):
+    '''Parse a corpus size such as 1000, 10k or 10M.'''
+    scale = {'k' : 1000, 'm' : 1000000}.get(s[-1:].lower())
+    return int(s[:-1]) * scale if scale else int(s)
+
+def _percentile(sorted_values, p):
+    # Nearest rank percentile
+    i = max(0, min(len(sorted_values) - 1,
+                   round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[i]
+
+def _throughput(op, inputs):
+    start = time.perf_counter()
+    for x in inputs:
+        op(x)
+    return time.perf_counter() - start
+
+def _latencies(op, inputs):
+    clock = time.perf_counter_ns
+    times = []
+    for x in inputs:
+        t = clock()
+        op(x)
+        times.append(clock() - t)
+    times.sort()
+    return {f'p{p:g}' : _percentile(times, p) for p in PERCENTILES}
+
+def _peak_memory(op, inputs):
+    tracemalloc.start()
+    try:
+        results = [op(x) for x in inputs]
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del results
+    return peak
+
+def run_case(name, corpus, repeat=3, latency_sample=100000,
+             memory_sample=1000000):
+    '''Run the named case over the corpus returning a dict of its results.'''
+    (make_inputs, op) = CASES[name]
+    inputs = make_inputs(corpus)
+    times = [_throughput(op, inputs) for _ in range(repeat)]
+    seconds = min(times)
+    return {'case' : name,
+            'size' : len(corpus),
+            'seconds' : seconds,
+            'ops_per_sec' : len(inputs) / seconds,
+            'noise' : max(times) / seconds - 1,
+            'latency_ns' : _latencies(op, inputs[:latency_sample]),
+            'memory_items' : min(len(inputs), memory_sample),
+            'peak_memory_bytes' : _peak_memory(op, inputs[:memory_sample])}
+
+def compare(baseline, current, threshold):
+    '''Compare the results of two runs. A case regressed if its ops/sec fell
+    by more than the threshold plus the larger noise of the two runs, the
+    noise counting for no more than the threshold.
+
+    Returns
+
+    A list of tuples of the case, size, baseline and current ops/sec, the
+    noise allowed and whether the case regressed, for each case and size
+    run in both.
+    '''
+    base = {(r['case'], r['size']) : r for r in baseline['results']}
+    rv = []
+    for r in current['results']:
+        b = base.get((r['case'], r['size']))
+        if b is not None:
+            (before, after) = (b['ops_per_sec'], r['ops_per_sec'])
+            noise = min(max(b.get('noise', 0), r.get('noise', 0)), threshold)
+            rv.append((r['case'], r['size'], before, after, noise,
+                       after < before * (1 - threshold - noise)))
+    return rv
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark reference operations over synthetic corpora')
+    parser.add_argument('--sizes', default='1k,10k,100k',
+                        help='comma separated corpus sizes, e.g. 1k,1M,10M')
+    parser.add_argument('--cases', default=','.join(CASES),
+                        help='comma separated cases to run')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='corpus random seed')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='throughput runs of which the best is reported')
+    parser.add_argument('--latency-sample', type=int, default=100000,
+                        help='maximum calls timed individually')
+    parser.add_argument('--memory-sample', type=int, default=1000000,
+                        help='maximum calls traced for peak memory')
+    parser.add_argument('--save', metavar='FILE',
+                        help='save the results as JSON')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='compare with results saved by --save')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='least fall in ops/sec reported as a '
+                             'regression, widened by the noise of the runs '
+                             'up to twice this')
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error('--repeat must be at least 1')
+    if args.baseline and args.repeat < 3:
+        parser.error('--baseline requires --repeat 3 or more to measure '
+                     'the noise of each case')
+
+    cases = args.cases.split(',')
+    for c in cases:
+        if c not in CASES:
+            parser.error(f'unknown case {c}, choose from {", ".join(CASES)}')
+
+    results = []
+    print(f'{"case":<20}{"size":>10}{"ops/sec":>12}{"p50 ns":>9}'
+          f'{"p99 ns":>9}{"p99.9 ns":>10}{"peak KiB":>11}')
+    for size in (parse_size(s) for s in args.sizes.split(',')):
+        corpus = make_corpus(size, args.seed)
+        for c in cases:
+            r = run_case(c, corpus, args.repeat, args.latency_sample,
+                         args.memory_sample)
+            results.append(r)
+            lat = r['latency_ns']
+            print(f'{c:<20}{size:>10}{r["ops_per_sec"]:>12.0f}'
+                  f'{lat["p50"]:>9}{lat["p99"]:>9}{lat["p99.9"]:>10}'
+                  f'{r["peak_memory_bytes"] / 1024:>11.0f}')
+    run = {'python' : platform.python_version(),
+           'platform' : platform.platform(),
+           'time' : time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+           'seed' : args.seed,
+           'results' : results}
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(run, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressed = False
+        print(f'\n{"case":<20}{"size":>10}{"baseline":>12}{"current":>12}'
+              f'{"change":>9}{"noise":>8}')
+        for (c, size, before, after, noise, worse) in compare(
+                baseline, run, args.threshold):
+            regressed |= worse
+            print(f'{c:<20}{size:>10}{before:>12.0f}{after:>12.0f}'
+                  f'{(after / before - 1) * 100:>8.1f}%'
+                  f'{noise * 100:>7.1f}%'
+                  f'{"  REGRESSION" if worse else ""}')
+        if regressed:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
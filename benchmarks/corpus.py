@@ -0,0 +1,99 @@
+#!/usr/bin/python
+# coding: utf-8
+'''
+Synthetic reference corpora for the benchmarks.
+
+A corpus is a list of reference strings drawn from a fixed mix of the forms
+seen in real input: single verses, verse ranges, whole chapters, verse lists
+and multi-book lists. Book names are written in full or abbreviated, in
+varying case and with or without a trailing full stop, using only spellings
+which BookID.fromStr() resolves to the intended book. Sub-verses and numbered
+books after a comma are left out as parse_refs() does not accept them. All
+references are within the chapter and verse bounds of the ETCBCH (Old
+Testament) or ETCBCG (New Testament) versifications so that every string both
+parses and expands. The same size and seed always give the same corpus.
+'''
+import random
+
+from bibleutils.versification import BookID, ETCBCGVersification, \
+     ETCBCHVersification
+
+# The relative frequency of each form of reference string
+FORM_WEIGHTS = (('verse', 40),
+                ('verse_range', 30),
+                ('chapter', 10),
+                ('verse_list', 10),
+                ('multi_book', 10))
+
+def versification_of(book_id):
+    '''Return the Versification holding the verse counts of the book.'''
+    if ETCBCHVersification.chapter_count(book_id) is not None:
+        return ETCBCHVersification
+    return ETCBCGVersification
+
+def _books():
+    # Tuples of the ID of each book with verse counts and the names by which
+    # it may be written, full and abbreviated
+    books = []
+    for (name, book_id) in sorted(BookID._map.items(), key=lambda x: x[1]):
+        if versification_of(book_id).chapter_count(book_id) is None:
+            continue
+        name = name.lstrip('_').split('_')[0]
+        lead = 1 if name[0].isdigit() else 0
+        full = name[:lead + 1] + name[lead + 1:].lower()
+        spellings = [s for s in (full, full[:lead + 3], full[:lead + 3] + '.',
+                                 full.upper(), full[:lead + 4])
+                     if BookID.fromStr(s.rstrip('.')) == book_id]
+        if spellings:
+            books.append((book_id, spellings))
+    return books
+
+class _Generator(object):
+    def __init__(self, seed):
+        self._rng = random.Random(seed)
+        self._books = _books()
+        self._unnumbered_books = [b for b in self._books
+                                  if not b[1][0][0].isdigit()]
+        (self._forms, weights) = zip(*FORM_WEIGHTS)
+        self._cum_weights = []
+        total = 0
+        for w in weights:
+            total += w
+            self._cum_weights.append(total)
+
+    def _book(self, books=None):
+        (book_id, spellings) = self._rng.choice(books or self._books)
+        return (book_id, self._rng.choice(spellings))
+
+    def _chapter(self, book_id):
+        vf = versification_of(book_id)
+        ch = self._rng.randint(1, vf.chapter_count(book_id))
+        return (ch, vf.verse_count(book_id, ch))
+
+    def _verse_ref(self, books=None):
+        (book_id, name) = self._book(books)
+        (ch, n) = self._chapter(book_id)
+        return f'{name} {ch}:{self._rng.randint(1, n)}'
+
+    def ref(self):
+        '''Return a reference string of a randomly chosen form.'''
+        rng = self._rng
+        form = rng.choices(self._forms, cum_weights=self._cum_weights)[0]
+        if form == 'verse':
+            return self._verse_ref()
+        (book_id, name) = self._book()
+        (ch, n) = self._chapter(book_id)
+        if form == 'chapter':
+            return f'{name} {ch}'
+        vs = rng.randint(1, n)
+        if form == 'verse_range':
+            return f'{name} {ch}:{vs}-{rng.randint(vs, n)}'
+        if form == 'verse_list':
+            verses = sorted(rng.sample(range(1, n + 1), min(n, 3)))
+            return f'{name} {ch}:' + ','.join(str(v) for v in verses)
+        return f'{name} {ch}:{vs}, {self._verse_ref(self._unnumbered_books)}'
+
+def make_corpus(size, seed=0):
+    '''Return a list of size synthetic reference strings.'''
+    gen = _Generator(seed)
+    return [gen.ref() for _ in range(size)]
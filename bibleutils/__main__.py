@@ -0,0 +1,9 @@
+# coding: utf-8
+'''
+Runs the bibleutils command. See bibleutils.cli.
+'''
+import sys
+
+from bibleutils.cli import main
+
+sys.exit(main())
@@ -0,0 +1,430 @@
+# coding: utf-8
+'''
+Array based operations on references for bulk data, such as whole columns of
+a table. These require NumPy.
+
+Book conversions use lookup arrays indexed by internal book ID which are
+built once per reference form from the book mappings of its versification
+system. Books which have no name in the target form are reported in a
+boolean mask rather than as None items.
+
+Packed references are the integers produced by Ref.pack() held in a uint64
+array. 
+
+@author:     47
+
+@copyright:  2017 47Rooks. All rights reserved.
+
+@license:    MIT
+
+@contact:    47rooks@gmail.com
+'''
+from collections import namedtuple
+from weakref import WeakKeyDictionary
+
+import numpy as np
+
+from bibleutils.versification import BookID, Ref, RefStatusID, \
+     ReferenceFormID, VersificationException, _registry_caches, format_ref, \
+     get_versification
+
+# The caches of arrays built from a Versification are keyed by the
+# Versification itself and hold it weakly, so they do not keep it alive and
+# their arrays are dropped with it. They are also cleared whenever a form is
+# registered.
+
+# Lookup arrays by the Versification registered for a reference form. See
+# _name_table() and _id_table().
+_name_tables = WeakKeyDictionary()
+_id_tables = WeakKeyDictionary()
+
+# Verse numbering arrays by Versification. See _verse_tables().
+_verse_tables_cache = WeakKeyDictionary()
+
+# Book order arrays by Versification. See _book_tables().
+_book_tables_cache = WeakKeyDictionary()
+
+# Verse label arrays by Versification. See _label_tables().
+_label_tables_cache = WeakKeyDictionary()
+
+_registry_caches.extend((_name_tables, _id_tables, _verse_tables_cache,
+                         _book_tables_cache, _label_tables_cache))
+
+def _name_table(form):
+    # A tuple of an object array of the book names of form indexed by
+    # internal book ID and a boolean array of which IDs have names
+    vf = get_versification(form)
+    table = _name_tables.get(vf)
+    if table is None:
+        size = max(BookID._map.values()) + 1
+        names = np.full(size, None, dtype=object)
+        mapped = np.zeros(size, dtype=bool)
+        for (name, book_id) in vf._bk_mapping.items():
+            names[book_id] = name
+            mapped[book_id] = True
+        table = _name_tables[vf] = (names, mapped)
+    return table
+
+def _id_table(form):
+    # A tuple of a sorted str array of the book names of form and an array of
+    # the corresponding internal book IDs
+    vf = get_versification(form)
+    table = _id_tables.get(vf)
+    if table is None:
+        names = sorted(vf._bk_mapping)
+        table = _id_tables[vf] = (
+            np.array(names, dtype=str),
+            np.array([vf._bk_mapping[n] for n in names], dtype=np.int64))
+    return table
+
+def pack_refs(refs):
+    '''Return a uint64 array of the packed form of each of the refs. See
+    Ref.pack().
+    '''
+    return np.fromiter((r.pack() for r in refs), dtype=np.uint64)
+
+def book_names(book_ids, form):
+    '''Convert an array of internal book IDs to the book names of form.
+    
+    Returns
+    
+    A tuple of an object array of the names and a boolean array which is True
+    where the book has no name in the form. Unmapped names are None.
+    '''
+    (names, mapped) = _name_table(form)
+    ids = np.asarray(book_ids, dtype=np.intp)
+    ids = np.where((ids > 0) & (ids < len(names)), ids, 0)
+    return (names[ids], ~mapped[ids])
+
+def book_ids(names, form):
+    '''Convert an array of book names of form to internal book IDs. Names
+    are looked up with a binary search of the sorted names of the form, which
+    is fastest when names is already a str array.
+    
+    Returns
+    
+    A tuple of an int array of the book IDs and a boolean array which is True
+    where the name is not a book of the form. Unmapped IDs are 0.
+    '''
+    (keys, values) = _id_table(form)
+    names = np.asarray(names)
+    if names.dtype == object:
+        names = np.where(np.equal(names, None), '', names).astype(str)
+    i = np.minimum(np.searchsorted(keys, names), len(keys) - 1)
+    unmapped = keys[i] != names
+    return (np.where(unmapped, 0, values[i]), unmapped)
+
+def packed_books(packed):
+    '''Return the starting and ending book IDs of packed refs as a tuple of
+    two int arrays. The ending book ID is 0 where the ref is within one book.
+    '''
+    packed = np.asarray(packed, dtype=np.uint64)
+    return ((packed >> np.uint64(56)).astype(np.int64),
+            (packed >> np.uint64(24) & np.uint64(0xFF)).astype(np.int64))
+
+def convert_packed(packed, form):
+    '''Convert the books of packed refs to the book names of form.
+    
+    Returns
+    
+    A tuple of object arrays of the starting and ending book names and a
+    boolean array which is True where either book has no name in the form.
+    The ending book name is None where the ref is within one book.
+    '''
+    (st, end) = packed_books(packed)
+    (st_names, unmapped) = book_names(st, form)
+    (end_names, end_unmapped) = book_names(end, form)
+    unmapped |= end_unmapped & (end != 0)
+    return (st_names, end_names, unmapped)
+
+def _verse_tables(vf):
+    # A tuple of arrays for Versification vf. The first three are indexed by
+    # book ID << 8 | chapter and give the ordinal of the first verse of the
+    # chapter, the number of verses in it (0 if it does not exist) and the
+    # number of chapters in the book (at chapter 0). The fourth is indexed by
+    # verse ordinal and gives the packed point of the verse.
+    tables = _verse_tables_cache.get(vf)
+    if tables is None:
+        size = len(vf._verse_counts) << 8
+        (starts, counts, chapters) = (np.zeros(size, dtype=np.int64),
+                                      np.zeros(size, dtype=np.int64),
+                                      np.zeros(size, dtype=np.int64))
+        points = np.zeros(vf._verse_total, dtype=np.uint64)
+        for b in vf._numbered_books:
+            chapters[b << 8] = vf.chapter_count(b)
+            for ch in range(1, vf.chapter_count(b) + 1):
+                o = vf._verse_ordinal(b, ch, 1)
+                n = vf.verse_count(b, ch)
+                starts[b << 8 | ch] = o
+                counts[b << 8 | ch] = n
+                points[o:o + n] = (b << 24 | ch << 16) + \
+                    (np.arange(1, n + 1, dtype=np.uint64) << np.uint64(8))
+        tables = (starts, counts, chapters, points)
+        _verse_tables_cache[vf] = tables
+    return tables
+
+def _book_tables(vf):
+    # A tuple of arrays for Versification vf. The first is indexed by book ID
+    # and gives the position of the book in the book order of vf, or -1 if it
+    # is not in the system. The second is indexed by position and gives the
+    # number of books before it which have no verse counts, with a final
+    # entry for all the books.
+    tables = _book_tables_cache.get(vf)
+    if tables is None:
+        index = np.full(len(vf._verse_counts), -1, dtype=np.int64)
+        missing = np.zeros(len(vf._book_order) + 1, dtype=np.int64)
+        for (i, b) in enumerate(vf._book_order):
+            index[b] = i
+            missing[i + 1] = missing[i] + (vf._chapters(b) is None)
+        tables = _book_tables_cache[vf] = (index, missing)
+    return tables
+
+def _label_tables(form):
+    # A tuple of object arrays for the Versification of form. The first is
+    # indexed by verse ordinal and gives the reference string of the verse,
+    # or None if its book has no name. The second gives the string of each
+    # number from 0 to 255.
+    vf = get_versification(form)
+    tables = _label_tables_cache.get(vf)
+    if tables is None:
+        labels = np.full(vf._verse_total, None, dtype=object)
+        for b in vf._numbered_books:
+            name = vf.book_name(b)
+            for ch in range(1, vf.chapter_count(b) + 1):
+                o = vf._verse_ordinal(b, ch, 1)
+                n = vf.verse_count(b, ch)
+                labels[o:o + n] = [f'{name} {ch}:{vs}'
+                                   for vs in range(1, n + 1)]
+        numbers = np.array([str(i) for i in range(256)], dtype=object)
+        tables = _label_tables_cache[vf] = (labels, numbers)
+    return tables
+
+def _fields(packed, shift):
+    return (packed >> np.uint64(shift) & np.uint64(0xFF)).astype(np.int64)
+
+def verse_ordinals(book_ids, chapters, verses, versification):
+    '''Return the ordinals within versification of verses given by arrays of
+    internal book IDs, chapters and verses. See
+    Versification.verse_ordinal().
+    
+    Returns
+    
+    A tuple of an int array of the ordinals and a boolean array which is True
+    where the verse is not in the system. The ordinals of such verses are -1.
+    '''
+    (starts, counts, _, _) = _verse_tables(versification)
+    b = np.asarray(book_ids, dtype=np.int64)
+    ch = np.asarray(chapters, dtype=np.int64)
+    vs = np.asarray(verses, dtype=np.int64)
+    valid = (b > 0) & (b < len(starts) >> 8) & (ch > 0) & (ch < 256) & \
+        (vs > 0)
+    i = np.where(valid, b << 8 | ch, 0)
+    valid &= vs <= counts[i]
+    return (np.where(valid, starts[i] + vs - 1, -1), ~valid)
+
+def ordinal_verses(ordinals, versification):
+    '''Return the verses of an array of ordinals within versification as a
+    tuple of int arrays of their internal book IDs, chapters and verses. See
+    Versification.verse_at().
+    
+    Raises VersificationException if an ordinal is out of range.
+    '''
+    points = _verse_tables(versification)[3]
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    if ordinals.size and (ordinals.min() < 0 or
+                          ordinals.max() >= len(points)):
+        raise VersificationException(
+            'verse ordinal out of range',
+            f'ordinals run from 0 to {len(points) - 1}',
+            'correct the verse ordinals')
+    p = points[ordinals]
+    return (_fields(p, 24), _fields(p, 16), _fields(p, 8))
+
+# The fields of packed refs with their first and last verses resolved as
+# expand_refs() resolves them. st_i and end_i index the verse tables. See
+# _packed_bounds().
+_PackedBounds = namedtuple('_PackedBounds', [
+    'sb', 'sv', 'ssv', 'eb', 'ev', 'esv', 'single', 'st_ch', 'st_vs',
+    'end_ch', 'end_vs', 'st_i', 'end_i'])
+
+def _packed_bounds(packed, versification):
+    (_, counts, chapters, _) = _verse_tables(versification)
+    packed = np.asarray(packed, dtype=np.uint64)
+    (sb, sc, sv, ssv) = (_fields(packed, 56), _fields(packed, 48),
+                         _fields(packed, 40), _fields(packed, 32))
+    (eb, ec, ev, esv) = (_fields(packed, 24), _fields(packed, 16),
+                         _fields(packed, 8), _fields(packed, 0))
+    
+    # Books beyond the tables become book 0 which has no chapters
+    n_books = len(counts) >> 8
+    sb = np.where(sb < n_books, sb, 0)
+    eb = np.where(eb == 0, sb, np.where(eb < n_books, eb, 0))
+    same = eb == sb
+    single = same & (ec == 0) & (sv != 0)
+    end_ch = np.where(ec != 0, ec,
+                      np.where(same & (sc != 0), sc, chapters[eb << 8]))
+    st_ch = np.where(sc == 0, 1, sc)
+    st_vs = np.where(sv == 0, 1, sv)
+    end_vs = np.where(ev != 0, ev,
+                      np.where(single, sv,
+                               counts[eb << 8 | np.minimum(end_ch, 255)]))
+    return _PackedBounds(sb, sv, ssv, eb, ev, esv, single, st_ch, st_vs,
+                         end_ch, end_vs, sb << 8 | np.minimum(st_ch, 255),
+                         eb << 8 | np.minimum(end_ch, 255))
+
+def packed_ordinals(packed, versification):
+    '''Return the verse ordinals within versification of the first and last
+    verses of each of the packed refs. Missing end fields are resolved as
+    expand_refs() resolves them.
+    
+    Returns
+    
+    A tuple of int arrays of the first and last ordinals and a boolean array
+    which is True where the ref is not within the bounds of the system. The
+    ordinals of such refs are -1.
+    '''
+    b = _packed_bounds(packed, versification)
+    (starts, counts) = _verse_tables(versification)[:2]
+    invalid = ((b.st_vs > counts[b.st_i]) | (b.end_vs > counts[b.end_i]) |
+               (b.end_ch > 255))
+    lo = np.where(invalid, -1, starts[b.st_i] + b.st_vs - 1)
+    hi = np.where(invalid, -1, starts[b.end_i] + b.end_vs - 1)
+    invalid |= hi < lo
+    return (np.where(invalid, -1, lo), np.where(invalid, -1, hi), invalid)
+
+def validate_packed(packed, versification):
+    '''Check packed refs against the bounds of versification, as
+    versification.validate_refs() checks Refs, using arrays of the bounds
+    of the system built once per system.
+    
+    Returns
+    
+    A tuple of a boolean array which is True where the ref is valid and an
+    int8 array of the RefStatusID of each ref.
+    '''
+    b = _packed_bounds(packed, versification)
+    (starts, counts, chapters, _) = _verse_tables(versification)
+    (index, missing) = _book_tables(versification)
+    (sbi, ebi) = (index[b.sb], index[b.eb])
+    unknown = (sbi < 0) | (ebi < 0)
+    reversed_books = ebi < sbi
+    no_counts = missing[ebi + 1] > missing[np.maximum(sbi, 0)]
+    bad_ch = (b.st_ch > chapters[b.sb << 8]) | \
+        (b.end_ch > chapters[b.eb << 8])
+    bad_vs = (b.st_vs > counts[b.st_i]) | (b.end_vs > counts[b.end_i])
+    lo = starts[b.st_i] + b.st_vs - 1
+    hi = starts[b.end_i] + b.end_vs - 1
+    bad_sub = (b.ssv > 26) | (b.esv > 26) | ((b.ssv != 0) & (b.sv == 0)) | \
+        ((b.esv != 0) & (b.ev == 0) & ~b.single) | \
+        ((lo == hi) & (b.ssv != 0) & (b.esv != 0) & (b.esv < b.ssv))
+    
+    # The first status which applies, in the order of their values
+    status = np.select(
+        (unknown, reversed_books, no_counts, bad_ch, bad_vs, hi < lo, bad_sub),
+        (RefStatusID.UNKNOWN_BOOK, RefStatusID.BOOK_ORDER,
+         RefStatusID.NO_VERSE_COUNTS, RefStatusID.CHAPTER_RANGE,
+         RefStatusID.VERSE_RANGE, RefStatusID.REVERSED_RANGE,
+         RefStatusID.SUB_VERSE),
+        RefStatusID.VALID).astype(np.int8)
+    return (status == RefStatusID.VALID, status)
+
+def format_packed(packed, form):
+    '''Return an object array of the reference string of each packed ref, as
+    versification.format_ref() writes it in form. Refs of a verse or of a
+    range of verses within one chapter are formatted from a table of the
+    labels of every verse of the versification of form, built once per
+    system. Other refs are formatted one at a time.
+    
+    Raises VersificationException if a book has no name in the form.
+    '''
+    (labels, numbers) = _label_tables(form)
+    packed = np.asarray(packed, dtype=np.uint64)
+    vf = get_versification(form)
+    (lo, _, invalid) = packed_ordinals(packed, vf)
+    (sb, sc, sv, ssv) = (_fields(packed, 56), _fields(packed, 48),
+                         _fields(packed, 40), _fields(packed, 32))
+    (eb, ec, ev, esv) = (_fields(packed, 24), _fields(packed, 16),
+                         _fields(packed, 8), _fields(packed, 0))
+    # Verses within one chapter, where the verse table applies
+    fast = ~invalid & (sc != 0) & (sv != 0) & (ssv == 0) & (esv == 0) & \
+        ((eb == 0) | (eb == sb)) & ((ec == 0) | (ec == sc))
+    i = np.maximum(lo, 0)
+    rv = labels[i]
+    fast &= np.not_equal(rv, None)
+    rv = np.where(fast & (ev != 0), rv + '-' + numbers[ev], rv)
+    for j in np.flatnonzero(~fast):
+        rv[j] = format_ref(Ref.unpack(ReferenceFormID.BIBLEUTILS,
+                                      int(packed[j])), form)
+    return rv
+
+def packed_sort_keys(packed, versification):
+    '''Return a uint64 array of keys which order packed refs canonically in
+    versification, as Versification.ref_sort_key() orders Refs. The keys are
+    the packed refs with each book ID replaced by the position of the book,
+    from 1, in the book order of the system, or 255 if it is not in it.
+    '''
+    (index, _) = _book_tables(versification)
+    positions = np.where(index < 0, 255, index + 1).astype(np.uint64)
+    packed = np.asarray(packed, dtype=np.uint64)
+    (sb, eb) = packed_books(packed)
+    sb = np.where(sb < len(positions), sb, 0)
+    eb = np.where(eb < len(positions), eb, 0)
+    positions[0] = 255
+    st_pos = positions[sb]
+    end_pos = np.where(eb == 0, np.uint64(0), positions[eb])
+    return (st_pos << np.uint64(56) | end_pos << np.uint64(24) |
+            packed & np.uint64(0x00FFFFFF00FFFFFF))
+
+def sort_packed(packed, versification):
+    '''Return the packed refs sorted canonically in versification. See
+    packed_sort_keys(). The sort is stable.
+    '''
+    packed = np.asarray(packed, dtype=np.uint64)
+    return packed[np.argsort(packed_sort_keys(packed, versification),
+                             kind='stable')]
+
+def dedupe_packed(packed):
+    '''Return the packed refs without duplicates, keeping the first of each
+    in its original order.
+    '''
+    packed = np.asarray(packed, dtype=np.uint64)
+    (_, first) = np.unique(packed, return_index=True)
+    return packed[np.sort(first)]
+
+def packed_from_ordinals(lo, hi, versification):
+    '''Return packed refs for the ranges of verse ordinals lo to hi of
+    versification. The refs are packed as the Refs of RefSet are formed, so
+    that a single verse has no end and fields shared with the start are
+    omitted from the end.
+    '''
+    points = _verse_tables(versification)[3]
+    (lo, hi) = (np.asarray(lo, dtype=np.intp), np.asarray(hi, dtype=np.intp))
+    (st, end) = (points[lo], points[hi])
+    book_mask = np.uint64(0xFF000000)
+    ch_mask = np.uint64(0xFFFF0000)
+    end = np.where((st & book_mask) != (end & book_mask), end,
+                   np.where((st & ch_mask) != (end & ch_mask),
+                            end & ~book_mask,
+                            np.where(lo != hi, end & np.uint64(0xFF00),
+                                     np.uint64(0))))
+    return st << np.uint64(32) | end
+
+def map_packed(packed, verse_map):
+    '''Map packed refs of the source system of verse_map to packed refs of
+    its target system, as versification.map_refs() maps Refs.
+    
+    Returns
+    
+    A tuple of a uint64 array of the mapped refs and a boolean array which is
+    True where the ref has no equivalent in the target system. Unmapped refs
+    are 0.
+    '''
+    (lo, hi, unmapped) = packed_ordinals(packed, verse_map.source)
+    first = np.frombuffer(verse_map._first, dtype=verse_map._first.typecode)
+    last = np.frombuffer(verse_map._last, dtype=verse_map._last.typecode)
+    t_lo = np.where(unmapped, -1, first[np.maximum(lo, 0)])
+    t_hi = np.where(unmapped, -1, last[np.maximum(hi, 0)])
+    unmapped |= (t_lo < 0) | (t_hi < 0) | (t_hi < t_lo)
+    mapped = packed_from_ordinals(np.maximum(t_lo, 0), np.maximum(t_hi, 0),
+                                  verse_map.target)
+    return (np.where(unmapped, np.uint64(0), mapped), unmapped)
@@ -0,0 +1,282 @@
+# coding: utf-8
+'''
+The bibleutils command.
+
+    bibleutils convert --column COLUMN --to FORM [options] [INPUT] [-o OUTPUT]
+
+parses the references in one column of a delimited file and converts them to
+another reference form. The file is streamed in chunks of rows which are
+spread across a pool of worker processes. Results are written in input order
+as soon as each chunk is done, and at most a few chunks per worker are held in
+memory at a time, so files of any size may be processed.
+
+    bibleutils serve --socket PATH [--max-batch N] [--max-delay SECONDS]
+                     [--stats]
+
+runs the reference service on a Unix domain socket. See bibleutils.server.
+
+@author:     47
+
+@copyright:  2017 47Rooks. All rights reserved.
+
+@license:    MIT
+
+@contact:    47rooks@gmail.com
+'''
+import argparse
+import csv
+import os
+import sys
+from collections import deque
+from contextlib import nullcontext
+from multiprocessing import Pool
+
+from bibleutils.versification import BookID, ReferenceFormID, \
+     VersificationException, convert_refs, default_parser, enable_stats, \
+     format_refs
+
+# Chunks queued per worker process. More keeps the workers busy while the
+# writer catches up; fewer holds less in memory.
+_CHUNKS_PER_WORKER = 2
+
+# The names of internal book IDs, for reporting books without a name
+_BOOK_ID_NAMES = {v : k.lstrip('_') for (k, v) in BookID._map.items()}
+
+# The names of reference forms
+_FORM_NAMES = {v : k for (k, v) in ReferenceFormID._map.items()}
+
+def _book_name(book):
+    # The name of a book of a ref, which is an ID in the internal form
+    return _BOOK_ID_NAMES[book] if type(book) is int else book
+
+def _convert_value(value, form):
+    # A tuple of the reference string value converted to form and None, or
+    # of None and the error message if it cannot be converted
+    if not value.strip():
+        return (value, None)
+    result = default_parser.parse_result(value, ReferenceFormID.BIBLEUTILS)
+    if result.error is not None:
+        return (None, result.error.message)
+    converted = convert_refs(result.refs, form)
+    for (r, c) in zip(result.refs, converted):
+        for (book, name) in ((r.st_book, c.st_book), (r.end_book, c.end_book)):
+            if name is None and book is not None:
+                return (None, f'book {_book_name(book)} has no name in '
+                              f'reference form {_FORM_NAMES[form]}')
+    return (format_refs(converted, style='separate'), None)
+
+# The conversion settings of a worker process. See _init_worker().
+_job = None
+
+def _init_worker(job):
+    global _job
+    _job = job
+
+def _convert_chunk(chunk):
+    # Convert the rows of a chunk. Returns a list of tuples of the row number,
+    # the output row and the error message or None. The output row of a row
+    # in error is the input row, with an empty output column if one is added.
+    (column, output_column, form) = _job
+    rv = []
+    for (n, row) in chunk:
+        try:
+            (value, error) = _convert_value(row[column], form)
+        except IndexError:
+            error = f'row has no column {column + 1}'
+        except VersificationException as e:
+            error = e.message
+        if output_column is not None:
+            row.append('' if error else value)
+        elif error is None:
+            row[column] = value
+        rv.append((n, row, error))
+    return rv
+
+def _chunks(rows, size, first_row):
+    # Lists of up to size tuples of row number and row
+    chunk = []
+    for (n, row) in enumerate(rows, first_row):
+        chunk.append((n, row))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _ordered_map(pool, func, iterable, max_pending):
+    # Like Pool.imap but never reads more than max_pending items ahead of the
+    # results consumed, keeping memory bounded for unbounded input.
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def _open(path, mode, encoding):
+    # The file or standard stream, which is left open when done
+    if path == '-':
+        f = sys.stdin if mode == 'r' else sys.stdout
+        f.reconfigure(newline='', encoding=encoding)
+        return nullcontext(f)
+    return open(path, mode, newline='', encoding=encoding)
+
+def _delimiter(args):
+    if args.delimiter is None:
+        return '\t' if os.path.splitext(args.input)[1].lower() in \
+            ('.tsv', '.tab') else ','
+    return '\t' if args.delimiter in ('\\t', 'tab') else args.delimiter
+
+def _column_index(column, header):
+    if column.isdigit():
+        if int(column) < 1:
+            raise ValueError('columns are numbered from 1')
+        return int(column) - 1
+    if header is None:
+        raise ValueError(f'column {column} must be a number without a header')
+    if column not in header:
+        raise ValueError(f'there is no column {column}')
+    return header.index(column)
+
+def convert(args):
+    '''Run the convert command with the parsed arguments. Returns the exit
+    status.
+    '''
+    form = getattr(ReferenceFormID, args.to)
+    try:
+        # Fails once here, rather than for every row, for a form without a
+        # registered versification system
+        convert_refs([], form)
+    except VersificationException as e:
+        print(f'bibleutils: cannot convert to {args.to}: {e.reason}',
+              file=sys.stderr)
+        return 2
+    delimiter = _delimiter(args)
+    errors = 0
+    with _open(args.input, 'r', args.encoding) as inp, \
+            _open(args.output, 'w', args.encoding) as out:
+        reader = csv.reader(inp, delimiter=delimiter)
+        writer = csv.writer(out, delimiter=delimiter, lineterminator='\n')
+        header = None if args.no_header else next(reader, None)
+        try:
+            column = _column_index(args.column, header)
+        except ValueError as e:
+            print(f'bibleutils: {e}', file=sys.stderr)
+            return 2
+        if header is not None:
+            if args.output_column is not None:
+                header = header + [args.output_column]
+            writer.writerow(header)
+
+        job = (column, args.output_column, form)
+        chunks = _chunks(reader, args.chunk_size,
+                         1 if header is None else 2)
+        if args.workers == 1:
+            _init_worker(job)
+            pool = None
+            results = map(_convert_chunk, chunks)
+        else:
+            pool = Pool(args.workers, _init_worker, (job,))
+            results = _ordered_map(pool, _convert_chunk, chunks,
+                                   args.workers * _CHUNKS_PER_WORKER)
+        try:
+            for result in results:
+                for (n, row, error) in result:
+                    if error is not None:
+                        errors += 1
+                        print(f'bibleutils: row {n}: {error}',
+                              file=sys.stderr)
+                        if args.errors == 'strict':
+                            return 1
+                        if args.errors == 'skip':
+                            continue
+                    writer.writerow(row)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+    if errors:
+        print(f'bibleutils: {errors} rows could not be converted',
+              file=sys.stderr)
+    return 0
+
+def serve(args):
+    '''Run the serve command with the parsed arguments. Returns the exit
+    status when the server is interrupted.
+    '''
+    # The server is imported only when used as asyncio is slow to import
+    from bibleutils.server import serve
+    if args.stats:
+        enable_stats()
+    serve(args.socket, args.max_batch, args.max_delay)
+    return 0
+
+def main(argv=None):
+    '''The entry point of the bibleutils command.'''
+    parser = argparse.ArgumentParser(
+        prog='bibleutils', description='Bible reference utilities')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser(
+        'convert',
+        help='convert a column of references in a delimited file',
+        description='Parse the references in a column of a CSV or TSV file '
+                    'and convert them to another reference form.')
+    p.add_argument('input', nargs='?', default='-',
+                   help='the input file, or - for standard input (default)')
+    p.add_argument('-o', '--output', default='-',
+                   help='the output file, or - for standard output (default)')
+    p.add_argument('-c', '--column', required=True,
+                   help='the name, or number from 1, of the reference column')
+    p.add_argument('-t', '--to', required=True, choices=list(ReferenceFormID),
+                   help='the reference form to convert to, which must have a '
+                        'registered versification system')
+    p.add_argument('--output-column', metavar='NAME',
+                   help='add the converted references as a new last column '
+                        'with this name rather than replacing the input')
+    p.add_argument('-d', '--delimiter',
+                   help='the field delimiter, or \\t for tab. By default tab '
+                        'for .tsv and .tab files and otherwise comma')
+    p.add_argument('--no-header', action='store_true',
+                   help='the input has no header row')
+    p.add_argument('--encoding', default='utf-8',
+                   help='the encoding of the input and output')
+    p.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                   help='worker processes, 1 to convert in this process '
+                        '(default: the number of CPUs)')
+    p.add_argument('--chunk-size', type=int, default=1000,
+                   help='rows sent to a worker at a time (default: 1000)')
+    p.add_argument('--errors', choices=('strict', 'skip', 'keep'),
+                   default='strict',
+                   help='on a row which cannot be converted, stop (strict, '
+                        'the default), drop the row (skip) or write it '
+                        'unconverted (keep). Errors are reported on standard '
+                        'error')
+    p.set_defaults(func=convert)
+
+    p = commands.add_parser(
+        'serve',
+        help='serve reference operations on a Unix domain socket',
+        description='Serve parse, convert, expand and validate requests as '
+                    'JSON lines on a Unix domain socket, running concurrent '
+                    'requests in batches.')
+    p.add_argument('-s', '--socket', required=True,
+                   help='the path of the socket')
+    p.add_argument('--max-batch', type=int, default=256,
+                   help='the most requests run in one batch (default: 256)')
+    p.add_argument('--max-delay', type=float, default=0.001,
+                   help='seconds a batch waits for more requests '
+                        '(default: 0.001)')
+    p.add_argument('--stats', action='store_true',
+                   help='collect statistics of parsing, conversion and '
+                        'expansion, reported by the stats operation')
+    p.set_defaults(func=serve)
+
+    args = parser.parse_args(argv)
+    if args.command == 'convert' and (args.workers < 1 or args.chunk_size < 1):
+        parser.error('--workers and --chunk-size must be at least 1')
+    if args.command == 'serve' and (args.max_batch < 1 or args.max_delay < 0):
+        parser.error('--max-batch must be at least 1 and --max-delay not '
+                     'negative')
+    return args.func(args)
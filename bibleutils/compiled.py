@@ -0,0 +1,230 @@
+# coding: utf-8
+'''
+Compiled versification files. A Versification is compiled once into a
+compact binary file which is then loaded through mmap. On little-endian
+hosts the verse count tables are read directly from the mapped file, so
+processes loading the same file share one read-only copy of them, and
+loading costs time in proportion to the number of books rather than the
+number of chapters or verses.
+
+A pre-fork server would typically compile the versification once, or ship
+the compiled file, and in each process call
+
+    register_versification(form, load_versification(path))
+
+Each MappedVersification owns its mapping of the file, which holds a file
+descriptor until it is closed with close() or by leaving a with block. A
+versification registered for the life of the process need not be closed.
+
+File format
+
+All integers are unsigned 32 bit little-endian, following a 32 byte header:
+
+    magic          4 bytes, b'BUVF'
+    version        16 bits, FORMAT_VERSION
+    flags          16 bits, 0
+    vid            the VersificationID
+    book_count     the number of books
+    chapter_count  the number of chapters of books with verse counts
+    names_size     the size of the name table in bytes
+    verse_total    the number of verses in the system
+    crc            the CRC-32 of the rest of the file
+
+and then these sections:
+
+    books          book_count records in book order of book ID, name offset,
+                   name length and chapter count, which is NO_COUNTS for a
+                   book without verse counts
+    verse counts   the verses in each chapter, chapter_count integers
+    offsets        for each book with verse counts, its ordinal of its first
+                   verse and then the verses before each of its chapters and
+                   after the last
+    names          the UTF-8 encoded book names
+
+@author:     47
+
+@copyright:  2017 47Rooks. All rights reserved.
+
+@license:    MIT
+
+@contact:    47rooks@gmail.com
+'''
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+
+from bibleutils.versification import BookID, Versification, \
+     VersificationException
+
+MAGIC = b'BUVF'
+FORMAT_VERSION = 1
+
+# The chapter count of a book without verse counts
+NO_COUNTS = 0xFFFFFFFF
+
+_HEADER = struct.Struct('<4sHHIIIIII')
+_BOOK = struct.Struct('<IIII')
+
+def compile_versification(versification, path):
+    '''Compile a Versification into a file which load_versification() can
+    load.
+
+    Parameters
+
+    versification - the Versification to compile.
+    path - the path of the file to write. An existing file is replaced.
+    '''
+    vf = versification
+    books = bytearray()
+    counts = []
+    offsets = []
+    names = bytearray()
+    for b in vf._book_order:
+        name = vf.book_name(b).encode('utf-8')
+        chapters = vf._chapters(b)
+        books += _BOOK.pack(b, len(names), len(name),
+                            NO_COUNTS if chapters is None else len(chapters))
+        names += name
+        if chapters is not None:
+            counts.extend(chapters)
+            offsets.append(vf._book_offsets[b])
+            offsets.extend(vf._chapter_offsets[b])
+    body = bytes(books) + \
+        struct.pack(f'<{len(counts)}I{len(offsets)}I', *counts, *offsets) + \
+        bytes(names)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, 0, vf.vid(),
+                          len(vf._book_order), len(counts), len(names),
+                          vf._verse_total, zlib.crc32(body))
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(body)
+
+def load_versification(path):
+    '''Load a file written by compile_versification() returning a
+    MappedVersification. The caller owns the mapping of the file, see
+    MappedVersification.close().
+    '''
+    return MappedVersification(path)
+
+def _read_uints(data):
+    # The little-endian unsigned 32 bit integers of the memoryview data, as a
+    # view of it on little-endian hosts
+    if sys.byteorder == 'little':
+        return data.cast('I')
+    # The tables cannot be shared and are copied in host order
+    rv = array('I')
+    rv.frombytes(data)
+    rv.byteswap()
+    return rv
+
+def _invalid(path, reason):
+    return VersificationException(
+        f'invalid compiled versification file {path}',
+        reason,
+        'recompile the file with compile_versification()')
+
+class MappedVersification(Versification):
+    '''A Versification loaded from a compiled file. It has the API of
+    Versification. The verse counts of each book are read-only views of the
+    mapped file rather than tuples.
+
+    The file is validated once, when loaded, and raises
+    VersificationException if it is not a compiled versification file of a
+    supported version or is corrupt.
+    
+    The mapping and its file descriptor are held until close() is called,
+    which a with statement does on leaving its block. On big-endian hosts the
+    tables are copied and the file is closed once loaded.
+
+    Parameters
+
+    path - the path of a file written by compile_versification().
+    '''
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise _invalid(path, 'the file is empty') from None
+        data = memoryview(self._mmap)
+        if len(data) < _HEADER.size:
+            raise _invalid(path, 'the file is too short')
+        (magic, version, _, vid, book_count, chapter_count, names_size,
+         verse_total, crc) = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise _invalid(path, 'the file is not a compiled versification')
+        if version != FORMAT_VERSION:
+            raise _invalid(path, f'the file format version {version} is '
+                                 'not supported')
+
+        # The sizes of the book records, counts, offsets and names
+        books_size = book_count * _BOOK.size
+        records = [_BOOK.unpack_from(data, _HEADER.size + i * _BOOK.size)
+                   for i in range(book_count)] \
+            if len(data) >= _HEADER.size + books_size else []
+        numbered = sum(1 for r in records if r[3] != NO_COUNTS)
+        size = _HEADER.size + books_size + \
+            4 * (2 * chapter_count + 2 * numbered) + names_size
+        if len(data) != size:
+            raise _invalid(path, 'the file size does not match its header')
+        if zlib.crc32(data[_HEADER.size:]) != crc:
+            raise _invalid(path, 'the file checksum does not match')
+
+        counts = _read_uints(data[_HEADER.size + books_size:size - names_size])
+        offsets = counts[chapter_count:]
+        counts = counts[:chapter_count]
+        names = data[size - names_size:]
+
+        bk_mapping = dict()
+        verse_counts = [None] * (max(BookID._map.values()) + 1)
+        chapter_offsets = [None] * len(verse_counts)
+        book_offsets = dict()
+        (c, o) = (0, 0)
+        for (b, name_offset, name_size, n) in records:
+            if not 0 < b < len(verse_counts) or b in bk_mapping.values():
+                raise _invalid(path, f'the book ID {b} is invalid')
+            name = bytes(names[name_offset:name_offset + name_size])
+            bk_mapping[name.decode('utf-8')] = b
+            if n == NO_COUNTS:
+                continue
+            if c + n > chapter_count:
+                raise _invalid(path, 'the chapter counts exceed the table')
+            verse_counts[b] = counts[c:c + n]
+            book_offsets[b] = offsets[o]
+            chapter_offsets[b] = offsets[o + 1:o + n + 2]
+            c += n
+            o += n + 2
+        if len(bk_mapping) != book_count:
+            raise _invalid(path, 'the file contains duplicate book names')
+        self._init_books(vid, bk_mapping)
+        self._init_verse_tables(verse_counts, chapter_offsets)
+        if self._verse_total != verse_total or any(
+                self._book_offsets[b] != v for (b, v) in book_offsets.items()):
+            raise _invalid(path, 'the verse offsets do not match the counts')
+        if sys.byteorder != 'little':
+            self.close()
+    
+    def close(self):
+        '''Release the mapping of the file. Verse counts read from the file
+        are views of the mapping, so this versification may not be used once
+        closed. Closing it again has no effect.
+        
+        Raises BufferError if a view of the mapping taken from this
+        versification, such as a slice of its verse counts, is still held.
+        '''
+        if self._mmap is None:
+            return
+        for tables in (self._verse_counts, self._chapter_offsets):
+            for t in tables:
+                if isinstance(t, memoryview):
+                    t.release()
+        self._mmap.close()
+        self._mmap = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,142 @@
+# coding: utf-8
+'''
+Locate references in free running text such as commentaries, sermons and
+footnotes.
+
+The text is searched in one pass for book names, which are compiled into a
+single regular expression in the form of a trie of alternatives. Sharing
+prefixes this way means that at each position of the text the expression
+engine follows at most one branch per character, much as an Aho-Corasick
+automaton does, and the set of possible first characters lets it skip
+quickly over text which cannot start a name. The reference grammar is
+checked only where a book name is followed by a chapter number, and the
+parser is run only on the text it accepts.
+
+Book names are the one word names of BookID and the common abbreviations of
+BookID.abbreviations(), in title case or upper case, such as 'Genesis',
+'Gen', 'Gen.', 'GEN', 'Ps', 'Mt', '1Sam' and '1 Sam'. Other prefixes of the
+names, which parse_refs() also accepts, are not recognised as many are
+ordinary words, such as 'Number' and 'Act'. Nor are lower case names as too
+much ordinary prose would match. A reference which parse_refs() cannot read, such
+as a range across chapters, is not reported.
+
+@author:     47
+
+@copyright:  2017 47Rooks. All rights reserved.
+
+@license:    MIT
+
+@contact:    47rooks@gmail.com
+'''
+import re
+from collections import namedtuple
+
+from bibleutils.versification import BookID, ReferenceFormID, \
+     convert_refs, default_parser
+
+RefMatch = namedtuple('RefMatch', ['start', 'end', 'refs'])
+RefMatch.__doc__ = '''A reference found in text. The reference is
+text[start:end] and refs is the list of Refs parsed from it.'''
+
+def _book_names():
+    # The spellings of the book names and abbreviations recognised
+    names = set()
+    for (k, v) in BookID._map.items():
+        words = [] if '_' in k[1:] else [k[1] + k[2:].lower()]
+        for w in words + list(BookID.abbreviations(v)):
+            # Title case capitalises the first letter after a digit
+            i = 1 if w[0].isdigit() else 0
+            names.add(w[:i] + w[i].upper() + w[i + 1:])
+            names.add(w.upper())
+    return names
+
+def _trie_pattern(words):
+    # A regular expression matching any of the words, with the alternatives
+    # nested by common prefix. Longer words are tried before their prefixes.
+    trie = dict()
+    for w in words:
+        node = trie
+        for c in w:
+            node = node.setdefault(c, dict())
+        node[''] = None
+
+    def pattern(node):
+        alts = []
+        for c in sorted(k for k in node if k):
+            alts.append(re.escape(c) + pattern(node[c]))
+        if not alts:
+            return ''
+        s = alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+        if '' in node:
+            s = f'(?:{s})?'
+        return s
+    return pattern(trie)
+
+def _compile():
+    # The expression matching a reference. A digit starting a book name may
+    # be followed by a space, as in '1 John'.
+    book = _trie_pattern(_book_names())
+    book = re.sub(r'([1-9])', r'\1 ?', book)
+    item = r'\d+(?:[ \t]?:[ \t]?\d+)?(?:[ \t]?-[ \t]?\d+)?'
+    return re.compile(
+        rf'(?<!\w)(?:{book})\.?[ \t]?{item}'
+        rf'(?:[ \t]?,[ \t]?(?:(?:{book})\.?[ \t]?)?{item})*'
+        r'(?![\w:-])')
+
+_RE_NUMBERED_BOOK = re.compile(r'(?<!\d)([1-9]) (?=[A-Za-z])')
+
+# The compiled expression, built on first use. See _pattern().
+_ref_pattern = None
+
+def _pattern():
+    global _ref_pattern
+    if _ref_pattern is None:
+        _ref_pattern = _compile()
+    return _ref_pattern
+
+def _parse_longest(s, parse):
+    # Parse the longest prefix of s ending before a comma, or at the end,
+    # which is a valid reference. Returns the length of the prefix and its
+    # refs, or None.
+    end = len(s)
+    while end > 0:
+        result = parse(_RE_NUMBERED_BOOK.sub(r'\1', s[:end]),
+                       ReferenceFormID.BIBLEUTILS)
+        if result.error is None:
+            return (end, result.refs)
+        end = s.rfind(',', 0, end)
+    return None
+
+def scan_refs(text, form=ReferenceFormID.BIBLEUTILS, parser=None):
+    '''Find the references in text, yielding them in order.
+
+    Parameters
+
+    text - the string to search.
+    form - the reference form of the Refs returned. See convert_refs().
+    parser - the RefParser used to parse the references found. By default
+             this is default_parser.
+
+    Yields
+
+    A RefMatch of the location of each reference and its list of Refs.
+    '''
+    parse = (parser or default_parser).parse_result
+    search = _pattern().search
+    pos = 0
+    while True:
+        m = search(text, pos)
+        if m is None:
+            return
+        found = _parse_longest(m.group(), parse)
+        if found is None:
+            # Later names in the match may yet start a reference
+            pos = m.start() + 1
+            continue
+        (length, refs) = found
+        refs = list(refs)
+        if form != ReferenceFormID.BIBLEUTILS:
+            refs = convert_refs(refs, form)
+        yield RefMatch(m.start(), m.start() + length, refs)
+        # Search again after a reference shortened to one the parser reads
+        pos = m.start() + length
@@ -0,0 +1,360 @@
+# coding: utf-8
+'''
+A local reference resolution service, so that several processes may share
+one warm copy of the versification tables and the parser cache rather than
+each importing bibleutils and building its own.
+
+The server listens on a Unix domain socket and speaks JSON lines: each
+request is one JSON object on a line and each response is one JSON object on
+a line. A client may send many requests without waiting for the responses,
+which carry the id of their request and may arrive in any order.
+
+    {"id": 1, "op": "parse", "refs": "Gen 1:1-3"}
+    {"id": 1, "result": [[0, 1, null, 1, null, 1, 3, null, null]]}
+
+The operations are
+
+    parse     refs                      the Refs of the reference string
+    convert   refs, form                the Refs converted to a reference form
+    expand    refs [, versification]    the verses of the Refs. See
+                                        expand_refs()
+    validate  refs, versification       the RefStatusID name of each Ref. See
+                                        validate_refs()
+    stats                               the statistics of the server
+
+where forms and versifications are given by the name of a ReferenceFormID.
+Refs are written as lists of their fields: the reference form, the starting
+and ending book, chapter, verse and sub-verse. A request which fails has an
+error object in place of its result, with the message, reason and action of
+the VersificationException.
+
+Requests arriving together are run as a micro-batch. The server collects the
+requests queued while the previous batch ran, waiting at most max_delay for
+more, and passes them through the bulk operations in one call per operation
+and form. Batches run in a single worker thread so that the event loop keeps
+accepting requests meanwhile.
+
+The stats operation reports the number of requests answered and of those
+which failed, the current and greatest depth of the queue, and histograms of
+batch sizes and of the latency of each operation from arrival to response.
+Histogram buckets are powers of two and are reported as pairs of the
+bucket's upper bound, in microseconds or requests, and its count. It also
+reports the statistics of the library as get_stats() returns them, which
+are collected only once enable_stats() is called, as by the --stats option
+of bibleutils serve.
+
+@author:     47
+
+@copyright:  2017 47Rooks. All rights reserved.
+
+@license:    MIT
+
+@contact:    47rooks@gmail.com
+'''
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bibleutils.versification import RefStatusID, ReferenceFormID, \
+     VersificationException, convert_refs, expand_refs, get_stats, \
+     get_versification, parse_refs_many, validate_refs
+
+OPERATIONS = ('parse', 'convert', 'expand', 'validate', 'stats')
+
+_STATUS_NAMES = {v : k for (k, v) in RefStatusID._map.items()}
+
+class Histogram(object):
+    '''A histogram of non-negative values in buckets whose upper bounds are
+    successive powers of two.
+    '''
+    def __init__(self):
+        self._counts = []
+        self._total = 0
+        self._sum = 0
+
+    def add(self, value):
+        '''Count one value.
+        '''
+        i = max(0, int(value) - 1).bit_length()
+        if i >= len(self._counts):
+            self._counts.extend([0] * (i + 1 - len(self._counts)))
+        self._counts[i] += 1
+        self._total += 1
+        self._sum += value
+
+    def to_dict(self):
+        '''Return the histogram as a dict of the count and mean of the values
+        and a list of pairs of the upper bound and count of each non-empty
+        bucket.
+        '''
+        return {'count' : self._total,
+                'mean' : self._sum / self._total if self._total else 0,
+                'buckets' : [[1 << i, n] for (i, n) in enumerate(self._counts)
+                             if n]}
+
+def _ref_fields(r):
+    return [r.versification, r.st_book, r.end_book, r.st_ch, r.end_ch,
+            r.st_vs, r.end_vs, r.st_sub_vs, r.end_sub_vs]
+
+def _form(request, key, required=True):
+    # The ReferenceFormID named by a field of the request
+    name = request.get(key)
+    if name is None and not required:
+        return None
+    if name not in ReferenceFormID._map:
+        raise VersificationException(
+            f'unsupported {key} {name}',
+            f'the {key} must be the name of a reference form',
+            f'specify one of {", ".join(ReferenceFormID)}')
+    return ReferenceFormID._map[name]
+
+def _split(items, lengths):
+    # Split the list items into consecutive lists of the given lengths
+    rv = []
+    i = 0
+    for n in lengths:
+        rv.append(items[i:i + n])
+        i += n
+    return rv
+
+def _run_batch(requests):
+    # Run a batch of requests returning a list of the result or the
+    # VersificationException of each. Runs in the worker thread.
+    results = [None] * len(requests)
+    refs = [None] * len(requests)
+    texts = []
+    for (i, request) in enumerate(requests):
+        if not isinstance(request.get('refs'), str):
+            results[i] = VersificationException(
+                'missing refs', 'the refs must be a reference string',
+                'add the refs to the request')
+        else:
+            texts.append((i, request['refs']))
+    for ((i, _), parsed) in zip(texts, parse_refs_many(
+            (t for (_, t) in texts), ReferenceFormID.BIBLEUTILS,
+            errors='result')):
+        if parsed.error is None:
+            refs[i] = parsed.refs
+        else:
+            results[i] = parsed.exception()
+
+    # Requests for the same operation and form are run in one call
+    groups = dict()
+    for (i, request) in enumerate(requests):
+        if results[i] is not None:
+            continue
+        op = request['op']
+        try:
+            if op == 'convert':
+                key = (op, _form(request, 'form'))
+            elif op in ('expand', 'validate'):
+                key = (op, _form(request, 'versification', op == 'validate'))
+            else:
+                key = (op, None)
+        except VersificationException as e:
+            results[i] = e
+            continue
+        groups.setdefault(key, []).append(i)
+
+    for ((op, form), indexes) in groups.items():
+        try:
+            if op == 'parse':
+                for i in indexes:
+                    results[i] = [_ref_fields(r) for r in refs[i]]
+            elif op == 'convert':
+                converted = convert_refs([r for i in indexes for r in refs[i]],
+                                         form)
+                for (i, c) in zip(indexes, _split(
+                        converted, [len(refs[i]) for i in indexes])):
+                    results[i] = [_ref_fields(r) for r in c]
+            elif op == 'expand':
+                vf = None if form is None else get_versification(form)
+                for i in indexes:
+                    try:
+                        results[i] = [_ref_fields(r)
+                                      for r in expand_refs(refs[i], vf)]
+                    except VersificationException as e:
+                        results[i] = e
+            else:
+                (_, statuses) = validate_refs(
+                    [r for i in indexes for r in refs[i]],
+                    get_versification(form))
+                for (i, s) in zip(indexes, _split(
+                        statuses, [len(refs[i]) for i in indexes])):
+                    results[i] = [_STATUS_NAMES[v] for v in s]
+        except VersificationException as e:
+            for i in indexes:
+                if results[i] is None:
+                    results[i] = e
+    return results
+
+class RefServer(object):
+    '''A server of reference operations on a Unix domain socket. See the
+    module documentation for the protocol.
+
+    Parameters
+
+    path - the path of the socket. An existing socket file is replaced.
+    max_batch - the most requests run in one batch.
+    max_delay - the longest time in seconds for which a batch waits for
+                more requests once one has arrived.
+    '''
+    def __init__(self, path, max_batch=256, max_delay=0.001):
+        self._path = path
+        self._max_batch = max_batch
+        self._max_delay = max_delay
+        self._queue = None
+        self._server = None
+        self._batcher = None
+        self._executor = ThreadPoolExecutor(1)
+        self._requests = 0
+        self._errors = 0
+        self._max_depth = 0
+        self._batch_sizes = Histogram()
+        self._latencies = {op : Histogram() for op in OPERATIONS}
+
+    async def start(self):
+        '''Start listening on the socket.
+        '''
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.ensure_future(self._run())
+        self._server = await asyncio.start_unix_server(self._serve,
+                                                       self._path)
+
+    async def serve_forever(self):
+        '''Start the server if need be and serve until cancelled.
+        '''
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        '''Stop the server and remove its socket.
+        '''
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            self._batcher.cancel()
+            self._executor.shutdown(wait=False)
+            if os.path.exists(self._path):
+                os.unlink(self._path)
+
+    def stats(self):
+        '''Return a dict of the statistics reported by the stats operation.
+        '''
+        return {'requests' : self._requests,
+                'errors' : self._errors,
+                'queue_depth' : self._queue.qsize() if self._queue else 0,
+                'max_queue_depth' : self._max_depth,
+                'batch_sizes' : self._batch_sizes.to_dict(),
+                'latency_us' : {op : h.to_dict()
+                                for (op, h) in self._latencies.items()},
+                'library' : get_stats()}
+
+    async def _serve(self, reader, writer):
+        # Read the requests of a connection, answering each as it completes
+        pending = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.ensure_future(self._answer(line, writer))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        except asyncio.CancelledError:
+            # The server is shutting down and the connection is dropped
+            for task in pending:
+                task.cancel()
+        finally:
+            writer.close()
+
+    async def _answer(self, line, writer):
+        start = time.perf_counter()
+        request_id = None
+        op = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('a request must be a JSON object')
+            request_id = request.get('id')
+            op = request.get('op')
+            if op not in OPERATIONS:
+                raise VersificationException(
+                    f'unsupported operation {op}',
+                    'the operation is not one the server provides',
+                    f'specify one of {", ".join(OPERATIONS)}')
+            if op == 'stats':
+                result = self.stats()
+            else:
+                future = asyncio.get_running_loop().create_future()
+                self._queue.put_nowait((request, future))
+                self._max_depth = max(self._max_depth, self._queue.qsize())
+                result = await future
+            response = {'id' : request_id, 'result' : result}
+        except VersificationException as e:
+            response = {'id' : request_id,
+                        'error' : {'message' : e.message, 'reason' : e.reason,
+                                   'action' : e.action}}
+        except ValueError as e:
+            response = {'id' : request_id,
+                        'error' : {'message' : 'invalid request',
+                                   'reason' : str(e),
+                                   'action' : 'send one JSON object per line'}}
+        self._requests += 1
+        if 'error' in response:
+            self._errors += 1
+        if op in self._latencies:
+            self._latencies[op].add((time.perf_counter() - start) * 1e6)
+        writer.write(json.dumps(response).encode('utf-8') + b'\n')
+        await writer.drain()
+
+    def _take(self, batch):
+        # Move queued requests into the batch up to its maximum size
+        while len(batch) < self._max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+    async def _run(self):
+        # Run the queued requests in batches
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            self._take(batch)
+            if len(batch) < self._max_batch and self._max_delay > 0:
+                await asyncio.sleep(self._max_delay)
+                self._take(batch)
+            self._batch_sizes.add(len(batch))
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, _run_batch, [r for (r, _) in batch])
+            except Exception as e:
+                results = [VersificationException(
+                    'internal error', f'the batch failed with {e!r}',
+                    'report the request to the maintainers')] * len(batch)
+            for ((_, future), result) in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, VersificationException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+def serve(path, max_batch=256, max_delay=0.001):
+    '''Run a RefServer on the socket path until interrupted.
+    '''
+    server = RefServer(path, max_batch, max_delay)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,223 @@
+'''
+Tests of the array based reference operations.
+'''
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from bibleutils.versification import BookID, ReferenceFormID, Ref, \
+     parse_refs, VersificationException, ETCBCHVersification, map_refs, \
+     ETCBCHToETCBCGVerseMap
+
+@unittest.skipIf(np is None, 'NumPy is not installed')
+class Test(unittest.TestCase):
+
+    def testBookNames(self):
+        from bibleutils.arrays import book_names
+        (names, unmapped) = book_names(
+            np.array([BookID._GENESIS, BookID._MATTHEW, BookID._NUMBERS, 0, 200]),
+            ReferenceFormID.ETCBCH)
+        self.assertEqual(list(names), ['Genesis', None, 'Numeri', None, None],
+                         'wrong book names')
+        self.assertEqual(list(unmapped), [False, True, False, True, True],
+                         'wrong unmapped mask')
+
+    def testBookIds(self):
+        from bibleutils.arrays import book_ids
+        (ids, unmapped) = book_ids(['Matthew', 'Numeri', None, 'Matthew'],
+                                   ReferenceFormID.ETCBCG)
+        self.assertEqual(list(ids), [BookID._MATTHEW, 0, 0, BookID._MATTHEW],
+                         'wrong book ids')
+        self.assertEqual(list(unmapped), [False, True, True, False],
+                         'wrong unmapped mask')
+
+    def testBookIdsRoundTrip(self):
+        from bibleutils.arrays import book_ids, book_names
+        ids = np.random.default_rng(1).integers(1, 40, 10000)
+        (names, unmapped) = book_names(ids, ReferenceFormID.ETCBCH)
+        self.assertFalse(unmapped.any(), 'Hebrew book not mapped')
+        (back, unmapped) = book_ids(names, ReferenceFormID.ETCBCH)
+        self.assertTrue((back == ids).all(), 'book ids do not round trip')
+
+    def testConvertPacked(self):
+        from bibleutils.arrays import pack_refs, convert_packed
+        refs = parse_refs('Gen 1:1, Exodus-Numbers, Matt 2',
+                          ReferenceFormID.BIBLEUTILS)
+        packed = pack_refs(refs)
+        self.assertEqual(packed.dtype, np.uint64, 'wrong packed dtype')
+        self.assertEqual(list(packed), [r.pack() for r in refs],
+                         'wrong packed values')
+        (st, end, unmapped) = convert_packed(packed, ReferenceFormID.ETCBCH)
+        self.assertEqual(list(st), ['Genesis', 'Exodus', None],
+                         'wrong starting books')
+        self.assertEqual(list(end), [None, 'Numeri', None],
+                         'wrong ending books')
+        self.assertEqual(list(unmapped), [False, False, True],
+                         'wrong unmapped mask')
+
+    def testUnsupportedForm(self):
+        from bibleutils.arrays import book_names
+        with self.assertRaises(VersificationException):
+            book_names([1], ReferenceFormID.IGNTPSinaiticus)
+
+    def testPackedOrdinals(self):
+        from bibleutils.arrays import pack_refs, packed_ordinals
+        refs = [Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=1, sv=1),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=2),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._EXODUS, BookID._LEVITICUS),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=51),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._MATTHEW, sc=1)]
+        (lo, hi, invalid) = packed_ordinals(pack_refs(refs), ETCBCHVersification)
+        self.assertEqual(list(lo), [0, 31, 1533, -1, -1], 'wrong first ordinals')
+        self.assertEqual(list(hi), [0, 55, 1533 + 1213 + 859 - 1, -1, -1],
+                         'wrong last ordinals')
+        self.assertEqual(list(invalid), [False, False, False, True, True],
+                         'wrong invalid mask')
+
+    def testMapPacked(self):
+        from bibleutils.arrays import pack_refs, map_packed
+        refs = [Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=31, ec=32,
+                    sv=50, ev=3),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._EXODUS, sc=8),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=32, sv=1),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._LEVITICUS, sc=1)]
+        (mapped, unmapped) = map_packed(pack_refs(refs), ETCBCHToETCBCGVerseMap)
+        self.assertEqual(list(unmapped), [False, False, False, True],
+                         'wrong unmapped mask')
+        self.assertEqual(list(mapped[:3]),
+                         [r.pack() for r in map_refs(refs[:3],
+                                                     ETCBCHToETCBCGVerseMap)],
+                         'packed mapping differs from map_refs')
+        self.assertEqual(mapped[3], 0, 'unmapped ref not 0')
+
+    def testVerseOrdinals(self):
+        from bibleutils.arrays import verse_ordinals, ordinal_verses
+        vf = ETCBCHVersification
+        o = np.arange(vf.verse_total())
+        (b, ch, vs) = ordinal_verses(o, vf)
+        self.assertEqual((b[40], ch[40], vs[40]), vf.verse_at(40),
+                         'wrong verse of ordinal')
+        (ordinals, invalid) = verse_ordinals(b, ch, vs, vf)
+        self.assertTrue((ordinals == o).all(), 'ordinals do not round trip')
+        self.assertFalse(invalid.any(), 'valid verses reported invalid')
+        (ordinals, invalid) = verse_ordinals(
+            [BookID._GENESIS, BookID._GENESIS, BookID._GENESIS,
+             BookID._MATTHEW, 0, 200, BookID._GENESIS],
+            [2, 51, 1, 1, 1, 1, 0], [1, 1, 32, 1, 1, 1, 1], vf)
+        self.assertEqual(list(ordinals), [31, -1, -1, -1, -1, -1, -1],
+                         'wrong ordinals')
+        self.assertEqual(list(invalid),
+                         [False, True, True, True, True, True, True],
+                         'wrong invalid mask')
+        with self.assertRaises(VersificationException):
+            ordinal_verses([0, vf.verse_total()], vf)
+
+    def testValidatePacked(self):
+        import random
+        from bibleutils.arrays import pack_refs, validate_packed
+        from bibleutils.versification import validate_refs
+        vf = ETCBCHVersification
+        rng = random.Random(0)
+        books = [BookID._GENESIS, BookID._EXODUS, BookID._PSALMS,
+                 BookID._MATTHEW]
+        fields = [None, 1, 2, 3, 10, 31, 50, 51, 151, 255]
+        refs = []
+        while len(refs) < 5000:
+            sb = rng.choice(books)
+            try:
+                refs.append(Ref(ReferenceFormID.BIBLEUTILS, sb,
+                                rng.choice([None, sb, rng.choice(books)]),
+                                rng.choice(fields), rng.choice(fields),
+                                rng.choice(fields), rng.choice(fields),
+                                rng.choice([None, 'a', 'c']),
+                                rng.choice([None, 'b'])))
+            except VersificationException:
+                pass
+        (valid, statuses) = validate_packed(pack_refs(refs), vf)
+        (expected_valid, expected) = validate_refs(refs, vf)
+        self.assertEqual(list(statuses), expected,
+                         'statuses differ from validate_refs()')
+        self.assertEqual(list(valid), expected_valid,
+                         'validity differs from validate_refs()')
+        self.assertTrue(valid.any() and not valid.all(),
+                        'refs not a mix of valid and invalid')
+
+    def testFormatPacked(self):
+        from bibleutils.arrays import format_packed, pack_refs
+        from bibleutils.versification import format_ref
+        vf = ETCBCHVersification
+        refs = [vf.ordinal_ref(o) for o in range(0, vf.verse_total(), 97)]
+        refs += [Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, None, 1,
+                     None, 2, 5),
+                 Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, None, 3),
+                 Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS,
+                     BookID._EXODUS, 1, 2, 3, 4),
+                 Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, None, 1,
+                     None, 1, None, 'a'),
+                 Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, None, 1,
+                     None, 40)]
+        labels = format_packed(pack_refs(refs), ReferenceFormID.ETCBCH)
+        self.assertEqual(list(labels),
+                         [format_ref(r, ReferenceFormID.ETCBCH) for r in refs],
+                         'labels differ from format_ref()')
+        self.assertEqual(labels[-5], 'Genesis 1:2-5', 'wrong range label')
+        with self.assertRaises(VersificationException):
+            format_packed(pack_refs(parse_refs('Matt 1:1', 0)),
+                          ReferenceFormID.ETCBCH)
+
+    def testSortPacked(self):
+        from bibleutils.arrays import dedupe_packed, pack_refs, \
+             packed_sort_keys, sort_packed
+        from bibleutils.versification import Versification, \
+             VersificationID, sort_refs
+        vf = Versification(VersificationID.Accordance,
+                           {'Exodus' : BookID._EXODUS,
+                            'Genesis' : BookID._GENESIS})
+        refs = [r for s in ('Gen 2:1', 'Exod 3', 'Gen 1:2-3', 'Gen 1:2',
+                            'Gen 1:2-4', 'Lev 1', 'Gen 1', 'Exod 3')
+                for r in parse_refs(s, ReferenceFormID.BIBLEUTILS)]
+        packed = pack_refs(refs)
+        self.assertEqual(sort_packed(packed, vf).tolist(),
+                         pack_refs(sort_refs(refs, vf)).tolist(),
+                         'packed order differs from sort_refs()')
+        keys = packed_sort_keys(packed, vf)
+        self.assertEqual(keys.dtype, np.uint64, 'wrong key type')
+        self.assertGreater(keys[5], keys[0], 'book not in system not last')
+        self.assertEqual(dedupe_packed(packed).tolist(),
+                         packed[:7].tolist(), 'wrong de-duplication')
+        self.assertEqual(len(sort_packed(packed[:0], vf)), 0,
+                         'wrong sort of no refs')
+
+    def testTableCaches(self):
+        import gc
+        from bibleutils import arrays
+        from bibleutils.arrays import book_names, pack_refs, \
+             packed_ordinals
+        from bibleutils.versification import Versification, \
+             VersificationID, get_versification, register_versification
+        vf = Versification(VersificationID.Accordance,
+                           {'Gen' : BookID._GENESIS}, {'Gen' : [31, 25]})
+        refs = [Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, None, 2, None,
+                    3)]
+        self.assertEqual(packed_ordinals(pack_refs(refs), vf)[0].tolist(),
+                         [33], 'wrong ordinal')
+        self.assertIn(vf, arrays._verse_tables_cache, 'tables not cached')
+        n = len(arrays._verse_tables_cache)
+        del vf
+        gc.collect()
+        self.assertEqual(len(arrays._verse_tables_cache), n - 1,
+                         'tables kept after the versification was freed')
+        
+        book_names([BookID._GENESIS], ReferenceFormID.ETCBCH)
+        self.assertTrue(len(arrays._name_tables), 'names not cached')
+        # Registering a form again, even with the same system, clears them
+        register_versification(ReferenceFormID.ETCBCH,
+                               get_versification(ReferenceFormID.ETCBCH))
+        self.assertEqual(len(arrays._name_tables), 0,
+                         'tables not cleared on registration')
+
+if __name__ == "__main__":
+    unittest.main()
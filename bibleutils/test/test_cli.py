@@ -0,0 +1,102 @@
+'''
+Tests of the bibleutils command.
+'''
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from bibleutils.cli import main
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+
+    def _run(self, content, *args, name='in.csv'):
+        # Run the command on a file of the content returning the exit status,
+        # the output and the standard error
+        inp = os.path.join(self._dir.name, name)
+        out = os.path.join(self._dir.name, 'out')
+        with open(inp, 'w', newline='') as f:
+            f.write(content)
+        err = io.StringIO()
+        with contextlib.redirect_stderr(err):
+            status = main(['convert', inp, '-o', out] + list(args))
+        output = None
+        if os.path.exists(out):
+            with open(out, newline='') as f:
+                output = f.read()
+        return (status, output, err.getvalue())
+
+    def testConvert(self):
+        (status, output, err) = self._run(
+            'id,ref\n1,Gen 1:1-3\n2,"Num 3:4, Deut 5"\n3,\n',
+            '-c', 'ref', '-t', 'ETCBCH', '-w', '1')
+        self.assertEqual(status, 0, f'conversion failed: {err}')
+        self.assertEqual(output, 'id,ref\n1,Genesis 1:1-3\n'
+                                 '2,"Numeri 3:4, Deuteronomium 5"\n3,\n',
+                         'wrong output')
+
+    def testOutputColumn(self):
+        (status, output, err) = self._run(
+            'Mark 1:2\tx\n',
+            '-c', '1', '-t', 'BIBLEUTILS', '--no-header',
+            '--output-column', 'internal', '-w', '1', name='in.tsv')
+        self.assertEqual(status, 0, f'conversion failed: {err}')
+        self.assertEqual(output, 'Mark 1:2\tx\tMARK 1:2\n', 'wrong output')
+
+    def testErrors(self):
+        content = 'ref\nGen 1:1\nnot a ref\nMatt 1:1\nExod 2:2\n'
+        (status, output, err) = self._run(content, '-c', 'ref',
+                                          '-t', 'ETCBCH', '-w', '1')
+        self.assertEqual(status, 1, 'error did not fail')
+        self.assertIn('row 3: invalid', err, 'error not reported')
+        (status, output, err) = self._run(content, '-c', 'ref', '-t',
+                                          'ETCBCH', '-w', '1',
+                                          '--errors', 'skip')
+        self.assertEqual(status, 0, 'skipped errors failed')
+        self.assertEqual(output, 'ref\nGenesis 1:1\nExodus 2:2\n',
+                         'wrong output')
+        self.assertIn('row 4: book MATTHEW has no name in reference form '
+                      'ETCBCH', err, 'error not reported')
+        (status, output, err) = self._run(content, '-c', 'ref', '-t',
+                                          'ETCBCH', '-w', '1',
+                                          '--errors', 'keep')
+        self.assertEqual(status, 0, 'kept errors failed')
+        self.assertEqual(output, 'ref\nGenesis 1:1\nnot a ref\nMatt 1:1\n'
+                                 'Exodus 2:2\n', 'wrong output')
+
+    def testBadColumn(self):
+        (status, output, err) = self._run('ref\nGen 1:1\n', '-c', 'refs',
+                                          '-t', 'ETCBCH')
+        self.assertEqual(status, 2, 'bad column did not fail')
+        self.assertIn('there is no column refs', err, 'error not reported')
+
+    def testUnregisteredForm(self):
+        (status, output, err) = self._run('ref\nGen 1:1\nGen 1:2\n',
+                                          '-c', 'ref', '-t', 'Accordance',
+                                          '-w', '2')
+        self.assertEqual(status, 2, 'unregistered form did not fail')
+        self.assertIsNone(output, 'output written')
+        self.assertEqual(err, 'bibleutils: cannot convert to Accordance: '
+                              'the specified versification system is '
+                              'unknown\n',
+                         'error not reported once')
+
+    def testWorkersPreserveOrder(self):
+        rows = [f'{i},Gen {i % 50 + 1}:{i % 20 + 1}\n' for i in range(2000)]
+        content = 'id,ref\n' + ''.join(rows)
+        (status, serial, err) = self._run(content, '-c', 'ref', '-t',
+                                          'ETCBCG', '-w', '1')
+        self.assertEqual(status, 0, f'conversion failed: {err}')
+        (status, parallel, err) = self._run(content, '-c', 'ref', '-t',
+                                            'ETCBCG', '-w', '3',
+                                            '--chunk-size', '7')
+        self.assertEqual(status, 0, f'conversion failed: {err}')
+        self.assertEqual(parallel, serial, 'parallel output differs')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+'''
+Tests of compiled versification files.
+'''
+import os
+import struct
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import bibleutils.versification
+from bibleutils import compiled
+from bibleutils.compiled import compile_versification, load_versification, \
+     MappedVersification
+from bibleutils.versification import BookID, ReferenceFormID, Ref, \
+     VersificationException, VersificationID, Versification, \
+     ETCBCHVersification, ETCBCGVersification, count_verses, convert_refs, \
+     expand_refs, register_versification, RefSet
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+
+    def _compile(self, vf, name='vf.buvf'):
+        path = os.path.join(self._dir.name, name)
+        compile_versification(vf, path)
+        return path
+
+    def _keep_registry(self):
+        # Restore the registered reference forms when the test ends
+        vs = bibleutils.versification
+        saved = [(d, dict(d)) for d in (vs._form_versifications,
+                                        vs._form_book_names, vs._lazy_forms)]
+        def restore():
+            for (d, items) in saved:
+                d.clear()
+                d.update(items)
+            for cache in vs._registry_caches:
+                cache.clear()
+        self.addCleanup(restore)
+
+    def _corrupt(self, path, offset, data):
+        with open(path, 'r+b') as f:
+            f.seek(offset)
+            f.write(data)
+
+    def testRoundTrip(self):
+        for vf in (ETCBCHVersification, ETCBCGVersification):
+            mvf = load_versification(self._compile(vf))
+            self.assertIsInstance(mvf, MappedVersification)
+            self.assertEqual(mvf.vid(), vf.vid(), 'wrong vid')
+            self.assertEqual(mvf._book_order, vf._book_order,
+                             'wrong book order')
+            for b in vf._book_order:
+                self.assertEqual(mvf.book_name(b), vf.book_name(b),
+                                 f'wrong name of book {b}')
+                self.assertEqual(mvf.book_id(vf.book_name(b)), b,
+                                 f'wrong ID of book {b}')
+                self.assertEqual(mvf.chapter_count(b), vf.chapter_count(b),
+                                 f'wrong chapter count of book {b}')
+                for ch in range(0, (vf.chapter_count(b) or 0) + 2):
+                    self.assertEqual(mvf.verse_count(b, ch),
+                                     vf.verse_count(b, ch),
+                                     f'wrong verse count of {b} {ch}')
+            self.assertEqual(mvf._verse_total, vf._verse_total,
+                             'wrong verse total')
+            for o in range(0, vf._verse_total, 97):
+                self.assertEqual(mvf._verse_at(o), vf._verse_at(o),
+                                 f'wrong verse at ordinal {o}')
+
+    def testTablesAreMapped(self):
+        mvf = load_versification(self._compile(ETCBCHVersification))
+        self.assertIsInstance(mvf._chapters(BookID._GENESIS), memoryview,
+                              'verse counts are not a view of the file')
+        self.assertEqual(mvf.verse_count(BookID._GENESIS, 50), 26,
+                         'wrong verse count')
+
+    def testBooksWithoutCounts(self):
+        vf = Versification(VersificationID.Accordance,
+                           {'Mk' : BookID._MARK, 'Gen' : BookID._GENESIS,
+                            'Ex' : BookID._EXODUS},
+                           {'Gen' : [31, 25], 'Ex' : (22,)})
+        mvf = load_versification(self._compile(vf))
+        self.assertEqual(mvf._book_order,
+                         (BookID._MARK, BookID._GENESIS, BookID._EXODUS),
+                         'wrong book order')
+        self.assertIsNone(mvf.chapter_count(BookID._MARK),
+                          'counts of a book without them')
+        self.assertEqual(mvf._verse_at(56), (BookID._EXODUS, 1, 1),
+                         'wrong verse at ordinal 56')
+
+    def testVersificationAPI(self):
+        mvf = load_versification(self._compile(ETCBCHVersification))
+        self._keep_registry()
+        register_versification(ReferenceFormID.IGNTPSinaiticus, mvf)
+        refs = [Ref(ReferenceFormID.IGNTPSinaiticus, 'Genesis', 'Exodus',
+                    50, 1, 26, 2)]
+        self.assertEqual(count_verses(refs), 3, 'wrong verse count')
+        self.assertEqual(len(expand_refs(refs)), 3, 'wrong expansion')
+        self.assertEqual(convert_refs(refs, ReferenceFormID.BIBLEUTILS)[0]
+                         .end_book, BookID._EXODUS, 'wrong conversion')
+        self.assertEqual(RefSet(mvf, refs).verse_count(), 3,
+                         'wrong RefSet verse count')
+
+    def testBadMagic(self):
+        path = self._compile(ETCBCGVersification)
+        self._corrupt(path, 0, b'XXXX')
+        with self.assertRaises(VersificationException) as e:
+            load_versification(path)
+        self.assertEqual(e.exception.reason,
+                         'the file is not a compiled versification')
+
+    def testBadVersion(self):
+        path = self._compile(ETCBCGVersification)
+        self._corrupt(path, 4, b'\x09\x00')
+        with self.assertRaises(VersificationException) as e:
+            load_versification(path)
+        self.assertEqual(e.exception.reason,
+                         'the file format version 9 is not supported')
+
+    def testTruncated(self):
+        path = self._compile(ETCBCGVersification)
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 4)
+        with self.assertRaises(VersificationException) as e:
+            load_versification(path)
+        self.assertEqual(e.exception.reason,
+                         'the file size does not match its header')
+        with open(path, 'r+b') as f:
+            f.truncate(0)
+        with self.assertRaises(VersificationException) as e:
+            load_versification(path)
+        self.assertEqual(e.exception.reason, 'the file is empty')
+
+    def testBadChecksum(self):
+        path = self._compile(ETCBCGVersification)
+        self._corrupt(path, os.path.getsize(path) - 1, b'?')
+        with self.assertRaises(VersificationException) as e:
+            load_versification(path)
+        self.assertEqual(e.exception.reason,
+                         'the file checksum does not match')
+
+    def testBigEndianHost(self):
+        data = memoryview(struct.pack('<3I', 31, 25, 0x01020304))
+        with mock.patch.object(compiled.sys, 'byteorder', 'big'):
+            swapped = compiled._read_uints(data)
+        self.assertEqual(len(swapped), 3, 'wrong number of integers')
+        self.assertEqual(list(swapped),
+                         list(struct.unpack('>3I', data)),
+                         'integers not swapped to host order')
+        self.assertEqual(list(compiled._read_uints(data)),
+                         [31, 25, 0x01020304] if sys.byteorder == 'little'
+                         else list(struct.unpack('>3I', data)),
+                         'wrong integers in host order')
+
+    def testTablesMatchVersification(self):
+        vf = ETCBCHVersification
+        mvf = load_versification(self._compile(vf))
+        for name in ('_book_order', '_book_index', '_reverse_mapping',
+                     '_book_offsets', '_numbered_books',
+                     '_numbered_book_offsets', '_verse_total'):
+            self.assertEqual(getattr(mvf, name), getattr(vf, name),
+                             f'{name} differs')
+        self.assertEqual([None if c is None else tuple(c)
+                          for c in mvf._chapter_offsets],
+                         list(vf._chapter_offsets), 'chapter offsets differ')
+
+    def testClose(self):
+        path = self._compile(ETCBCHVersification)
+        with load_versification(path) as mvf:
+            self.assertEqual(mvf.verse_count(BookID._GENESIS, 50), 26,
+                             'wrong verse count')
+            mapping = mvf._mmap
+        self.assertTrue(mapping.closed, 'mapping not closed')
+        mvf.close()
+        with self.assertRaises(ValueError):
+            mvf.verse_count(BookID._GENESIS, 50)
+        mvf = load_versification(path)
+        view = mvf._chapters(BookID._GENESIS)[1:]
+        with self.assertRaises(BufferError):
+            mvf.close()
+        view.release()
+        mvf.close()
+        self.assertIsNone(mvf._mmap, 'mapping kept')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+'''
+Tests of finding references in free text.
+'''
+import unittest
+
+from bibleutils.scan import scan_refs, RefMatch
+from bibleutils.versification import BookID, ReferenceFormID, Ref, \
+     parse_refs
+
+class Test(unittest.TestCase):
+
+    def _found(self, text, **kwargs):
+        return [text[m.start:m.end] for m in scan_refs(text, **kwargs)]
+
+    def testScan(self):
+        text = 'In the beginning (Gen 1:1-3, 5) God created. See also ' \
+               'Exod. 3:14, Lev 19:18; compare Matt 5:3,4, Mark 1:2-3.'
+        matches = list(scan_refs(text))
+        self.assertEqual([text[m.start:m.end] for m in matches],
+                         ['Gen 1:1-3, 5', 'Exod. 3:14, Lev 19:18',
+                          'Matt 5:3,4, Mark 1:2-3'], 'wrong references')
+        self.assertIsInstance(matches[0], RefMatch, 'wrong match type')
+        self.assertEqual(matches[0].refs,
+                         parse_refs('Gen 1:1-3,5', ReferenceFormID.BIBLEUTILS),
+                         'wrong refs')
+
+    def testBookSpellings(self):
+        self.assertEqual(self._found('Genesis 2 and GEN 3 or Gen. 4 and gen 5'),
+                         ['Genesis 2', 'GEN 3', 'Gen. 4'],
+                         'wrong references')
+        matches = list(scan_refs('read 1 John 2:1 and 2Sam 3'))
+        self.assertEqual([(m.start, m.end) for m in matches],
+                         [(5, 15), (20, 26)], 'wrong spans')
+        self.assertEqual([m.refs[0].st_book for m in matches],
+                         [BookID._1JOHN, BookID._2SAMUEL], 'wrong books')
+
+    def testNotReferences(self):
+        self.assertEqual(self._found('General 3, Genesis, Ge 2, XGen 1:1, '
+                                     'Gen 1:1a and Gen 1:1-2:3'), [],
+                         'text wrongly found as references')
+
+    def testUnreadableTail(self):
+        # The parser rejects the reversed range, so the references before
+        # and after it are found separately
+        self.assertEqual(self._found('Gen 1:1, Exod 3:2-1, Lev 4.'),
+                         ['Gen 1:1', 'Lev 4'], 'wrong references')
+        self.assertEqual(self._found('Gen 1:1, 1 Sam 3:4.'),
+                         ['Gen 1:1, 1 Sam 3:4'], 'wrong references')
+
+    def testForm(self):
+        matches = list(scan_refs('see Num 3:4', form=ReferenceFormID.ETCBCH))
+        self.assertEqual(matches[0].refs,
+                         [Ref(ReferenceFormID.ETCBCH, 'Numeri', sc=3, sv=4)],
+                         'wrong refs')
+
+    def testProseNotReferences(self):
+        self.assertEqual(self._found('Number 5 was late. Act 2 began as the '
+                                     'Man 3 doors down sang at the Bar 5 '
+                                     'nights a week. Is 5 enough?'), [],
+                         'prose wrongly found as references')
+
+    def testShortAbbreviations(self):
+        text = 'Compare Ps 23:1; Mt 5:3; Jn 3:16 and 1 Jn 4:8.'
+        matches = list(scan_refs(text))
+        self.assertEqual([text[m.start:m.end] for m in matches],
+                         ['Ps 23:1', 'Mt 5:3', 'Jn 3:16', '1 Jn 4:8'],
+                         'abbreviations not found')
+        self.assertEqual([m.refs[0].st_book for m in matches],
+                         [BookID._PSALMS, BookID._MATTHEW, BookID._JOHN,
+                          BookID._1JOHN], 'wrong books')
+
+if __name__ == "__main__":
+    unittest.main()
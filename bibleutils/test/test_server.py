@@ -0,0 +1,112 @@
+'''
+Tests of the reference service.
+'''
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import unittest
+
+from bibleutils.server import Histogram, RefServer
+from bibleutils.versification import BookID, ReferenceFormID
+
+@unittest.skipIf(not hasattr(socket, 'AF_UNIX'),
+                 'Unix domain sockets are not supported')
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self._path = os.path.join(self._dir.name, 'bibleutils.sock')
+
+    def _requests(self, requests, **kwargs):
+        # Send the requests on one connection without waiting for responses,
+        # returning the responses by id and the server statistics
+        async def run():
+            server = RefServer(self._path, **kwargs)
+            await server.start()
+            try:
+                (reader, writer) = await asyncio.open_unix_connection(
+                    self._path)
+                for r in requests:
+                    writer.write(r if isinstance(r, bytes)
+                                 else json.dumps(r).encode() + b'\n')
+                await writer.drain()
+                responses = [json.loads(await reader.readline())
+                             for _ in requests]
+                writer.close()
+                return ({r['id'] : r for r in responses}, server.stats())
+            finally:
+                await server.close()
+        return asyncio.run(run())
+
+    def testOperations(self):
+        (responses, stats) = self._requests([
+            {'id' : 1, 'op' : 'parse', 'refs' : 'Gen 1:1-3'},
+            {'id' : 2, 'op' : 'convert', 'refs' : 'Num 3:4',
+             'form' : 'ETCBCH'},
+            {'id' : 3, 'op' : 'expand', 'refs' : 'Gen 1:29-31',
+             'versification' : 'ETCBCH'},
+            {'id' : 4, 'op' : 'validate', 'refs' : 'Gen 1:1, Gen 51:1',
+             'versification' : 'ETCBCH'},
+            {'id' : 5, 'op' : 'parse', 'refs' : 'Gen 1:1a'},
+            {'id' : 6, 'op' : 'convert', 'refs' : 'Gen 1', 'form' : 'None'},
+            {'id' : 7, 'op' : 'unknown'},
+            {'id' : 8, 'op' : 'stats'},
+            b'not json\n'])
+        B = ReferenceFormID.BIBLEUTILS
+        self.assertEqual(responses[1]['result'],
+                         [[B, BookID._GENESIS, None, 1, None, 1, 3, None, None]],
+                         'wrong parse result')
+        self.assertEqual(responses[2]['result'],
+                         [[ReferenceFormID.ETCBCH, 'Numeri', None, 3, None, 4,
+                           None, None, None]], 'wrong convert result')
+        self.assertEqual([r[3:6] for r in responses[3]['result']],
+                         [[1, None, 29], [1, None, 30], [1, None, 31]],
+                         'wrong expand result')
+        self.assertEqual(responses[4]['result'], ['VALID', 'CHAPTER_RANGE'],
+                         'wrong validate result')
+        for i in (5, 6, 7):
+            self.assertIn('error', responses[i], f'request {i} did not fail')
+            self.assertEqual(sorted(responses[i]['error']),
+                             ['action', 'message', 'reason'], 'wrong error')
+        self.assertEqual(responses[6]['error']['message'],
+                         'unsupported form None', 'wrong error message')
+        self.assertIn('queue_depth', responses[8]['result'],
+                      'wrong stats result')
+        self.assertIn('parse.calls', responses[8]['result']['library'],
+                      'no library stats')
+        self.assertIn(None, responses, 'no response to invalid JSON')
+        self.assertEqual(stats['requests'], 9, 'wrong request count')
+        self.assertEqual(stats['errors'], 4, 'wrong error count')
+        self.assertEqual(stats['queue_depth'], 0, 'requests left queued')
+
+    def testBatching(self):
+        requests = [{'id' : i, 'op' : 'convert', 'refs' : f'Gen {i}',
+                     'form' : 'ETCBCH'} for i in range(1, 51)]
+        (responses, stats) = self._requests(requests, max_batch=16,
+                                            max_delay=0.05)
+        for i in range(1, 51):
+            self.assertEqual(responses[i]['result'][0][1:4],
+                             ['Genesis', None, i], 'wrong result')
+        batches = stats['batch_sizes']
+        self.assertLess(batches['count'], 50, 'requests were not batched')
+        self.assertEqual(max(b for (b, _) in batches['buckets']), 16,
+                         'batches exceeded the maximum size')
+        self.assertEqual(stats['latency_us']['convert']['count'], 50,
+                         'wrong latency count')
+        self.assertGreater(stats['max_queue_depth'], 1,
+                           'no queue depth recorded')
+
+    def testHistogram(self):
+        h = Histogram()
+        for v in (0, 1, 2, 3, 4, 5, 1000):
+            h.add(v)
+        d = h.to_dict()
+        self.assertEqual(d['count'], 7, 'wrong count')
+        self.assertEqual(d['buckets'], [[1, 2], [2, 1], [4, 2], [8, 1],
+                                        [1024, 1]], 'wrong buckets')
+
+if __name__ == "__main__":
+    unittest.main()
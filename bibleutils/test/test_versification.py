@@ -3,10 +3,34 @@ Created on Jan 22, 2017
 
 @author: Daniel
 '''
+import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+import types
 import unittest
+import bibleutils.versification
 from bibleutils.versification import VersificationID, BookID, Identifier, \
      ReferenceFormID, parse_refs, ETCBCHVersification, Ref, convert_refs, \
-     expand_refs, VersificationException
+     expand_refs, VersificationException, RefParser, \
+     parse_refs_many, ETCBCGVersification, iter_expand_refs, count_verses, \
+     RefSet, VerseMap, map_refs, ETCBCHToETCBCGVerseMap, \
+     ETCBCGToETCBCHVerseMap, Versification, register_versification, \
+     get_versification, VerseSet, \
+     validate_ref, validate_refs, RefStatusID, format_ref, format_refs, \
+     sort_refs, dedupe_refs, enable_stats, stats_enabled, get_stats, \
+     reset_stats, collect_stats, ParseResult
+
+# The directory from which bibleutils is imported
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(bibleutils.versification.__file__))))
+
+# The most time in microseconds, excluding that of the modules it imports,
+# which importing bibleutils.versification may take. Tables must be built on
+# first use rather than at import to keep within it.
+_IMPORT_BUDGET_US = 15000
 
 class Test(unittest.TestCase):
 
@@ -490,13 +514,24 @@ class Test(unittest.TestCase):
         self.assertIsNone(e_refs[9].end_vs, 'end_vs is not None')
     
     def testExpandChapter(self):
+        refs = [Ref(ReferenceFormID.ETCBCH,
+                    'Deuteronomium', sc=3, ec=4, sv=4, ev=6)]
+        e_refs = expand_refs(refs)
+        self.assertEqual(len(e_refs), 32, 'incorrect number of expanded refs')
+        self.assertEqual((e_refs[25].st_ch, e_refs[25].st_vs), (3, 29),
+                         'wrong last verse of the chapter')
+        self.assertEqual((e_refs[26].st_ch, e_refs[26].st_vs), (4, 1),
+                         'wrong first verse of the next chapter')
+        self.assertEqual((e_refs[-1].st_ch, e_refs[-1].st_vs), (4, 6),
+                         'wrong last verse')
+
+    def testExpandChapterNoVerseCounts(self):
         with self.assertRaises(VersificationException) as expected_ex:
-            refs = [Ref(ReferenceFormID.ETCBCH,
-                        'Deuteronomium', sc=3, ec=4, sv=4, ev=6)]
+            refs = [Ref(ReferenceFormID.BIBLEUTILS,
+                        BookID._DEUTERONOMY, sc=3, ec=4, sv=4, ev=6)]
             expand_refs(refs)
 
         ex = expected_ex.exception
-        print(f'ex is {ex}')
         self.assertEqual(ex.message,
                          'reference extends over more than one chapter')        
     
@@ -506,14 +541,77 @@ class Test(unittest.TestCase):
                         'Deuteronomium', 'Exodus', sc=3, sv=4)]
             expand_refs(refs)
             
+        ex = expected_ex.exception
+        self.assertEqual(ex.message,
+                         'ending book Exodus is before the starting book Deuteronomium')        
+
+    def testExpandEndBookNoVerseCounts(self):
+        with self.assertRaises(VersificationException) as expected_ex:
+            refs = [Ref(ReferenceFormID.BIBLEUTILS,
+                        BookID._EXODUS, BookID._DEUTERONOMY, sc=3, sv=4)]
+            expand_refs(refs)
+            
         ex = expected_ex.exception
         self.assertEqual(ex.message,
                          'reference extends over more than one book')        
+
+    def testExpandChapterRange(self):
+        refs = parse_refs('Gen 1-3', ReferenceFormID.BIBLEUTILS)
+        e_refs = expand_refs(refs, ETCBCHVersification)
+        self.assertEqual(len(e_refs), 31 + 25 + 24,
+                         'incorrect number of expanded refs')
+        self.assertEqual(e_refs[0], Ref(ReferenceFormID.BIBLEUTILS,
+                                        BookID._GENESIS, sc=1, sv=1),
+                         'wrong first verse')
+        self.assertEqual(e_refs[-1], Ref(ReferenceFormID.BIBLEUTILS,
+                                         BookID._GENESIS, sc=3, sv=24),
+                         'wrong last verse')
+
+    def testExpandBookRange(self):
+        refs = [Ref(ReferenceFormID.ETCBCG, 'Matthew', 'Mark',
+                    sc=28, ec=1, sv=19, ev=3)]
+        e_refs = expand_refs(refs)
+        self.assertEqual([(r.st_book, r.st_ch, r.st_vs) for r in e_refs],
+                         [('Matthew', 28, 19), ('Matthew', 28, 20),
+                          ('Mark', 1, 1), ('Mark', 1, 2), ('Mark', 1, 3)],
+                         'wrong expansion')
+
+    def testExpandWholeBooks(self):
+        refs = [Ref(ReferenceFormID.ETCBCH, 'Obadia', 'Jona')]
+        e_refs = expand_refs(refs)
+        self.assertEqual(len(e_refs), 21 + 48, 'incorrect number of expanded refs')
+        self.assertEqual((e_refs[21].st_book, e_refs[21].st_ch, e_refs[21].st_vs),
+                         ('Jona', 1, 1), 'wrong first verse of second book')
+
+    def testExpandUnknownChapter(self):
+        with self.assertRaises(VersificationException) as expected_ex:
+            expand_refs([Ref(ReferenceFormID.ETCBCH, 'Maleachi', sc=4)])
+
+        ex = expected_ex.exception
+        self.assertEqual(ex.message, 'chapter 4 is not in book Maleachi')
+
+    def testVerseCounts(self):
+        self.assertEqual(ETCBCHVersification.chapter_count(BookID._JOEL), 4,
+                         'wrong chapter count')
+        self.assertEqual(ETCBCHVersification.verse_count(BookID._MALACHI, 3), 24,
+                         'wrong verse count')
+        self.assertEqual(ETCBCHVersification.verse_count(BookID._PSALMS, 119), 176,
+                         'wrong verse count')
+        self.assertIsNone(ETCBCHVersification.verse_count(BookID._MALACHI, 4),
+                          'verse count for unknown chapter')
+        self.assertIsNone(ETCBCHVersification.chapter_count(BookID._MATTHEW),
+                          'chapter count for unknown book')
+        self.assertEqual(ETCBCGVersification.verse_count(BookID._MATTHEW, 28), 20,
+                         'wrong verse count')
+        total = sum(ETCBCHVersification.verse_count(b, c)
+                    for b in range(1, 40)
+                    for c in range(1, ETCBCHVersification.chapter_count(b) + 1))
+        self.assertEqual(total, 23213, 'wrong number of verses in the BHSA')
              
     def testRefBadCh(self):
         with self.assertRaises(VersificationException) as expected_ex:
             Ref(ReferenceFormID.ETCBCH,
-                'Deuteronomium', 'Exodus', sc=3, ec=2)
+                'Deuteronomium', sc=3, ec=2)
             
         ex = expected_ex.exception
         self.assertEqual(ex.message,
@@ -522,12 +620,875 @@ class Test(unittest.TestCase):
     def testRefBadVs(self):
         with self.assertRaises(VersificationException) as expected_ex:
             Ref(ReferenceFormID.ETCBCH,
-                'Deuteronomium', 'Exodus', sv=3, ev=2)
+                'Deuteronomium', sv=3, ev=2)
             
         ex = expected_ex.exception
         self.assertEqual(ex.message,
                          'ending verse 2 is before the starting verse 3')        
         
+    def testRefParserCache(self):
+        parser = RefParser(maxsize=2)
+        r1 = parser.parse('Gen 1:1-2,6, Ex 17:3', ReferenceFormID.BIBLEUTILS)
+        r2 = parser.parse(' Gen 1:1-2,6, Ex 17:3 ', ReferenceFormID.BIBLEUTILS)
+        self.assertIs(r1, r2, 'normalized input not served from the cache')
+        self.assertIsInstance(r1, tuple, 'cached result is mutable')
+        self.assertEqual(len(r1), 3, 'incorrect number of refs')
+        info = parser.cache_info()
+        self.assertEqual((info.hits, info.misses, info.maxsize, info.currsize),
+                         (1, 1, 2, 1), f'unexpected cache statistics {info}')
+
+    def testRefParserBounded(self):
+        parser = RefParser(maxsize=2)
+        for refs in ('Gen 1', 'Ex 2', 'Lev 3', 'Gen 1'):
+            parser.parse(refs, ReferenceFormID.BIBLEUTILS)
+        info = parser.cache_info()
+        self.assertEqual(info.currsize, 2, f'cache not bounded {info}')
+        self.assertEqual(info.misses, 4, f'evicted entry was not re-parsed {info}')
+        parser.cache_clear()
+        self.assertEqual(parser.cache_info().currsize, 0, 'cache not cleared')
+
+    def testRefParserErrorsCached(self):
+        parser = RefParser()
+        for _ in range(2):
+            with self.assertRaises(VersificationException):
+                parser.parse('Exodus--Numbers', ReferenceFormID.BIBLEUTILS)
+        self.assertEqual(parser.cache_info().currsize, 1, 'error not cached')
+        self.assertEqual(parser.cache_info().hits, 1,
+                         'repeated error was parsed again')
+
+    def testParseRefsReturnsNewList(self):
+        r1 = parse_refs('Gen 1:1', ReferenceFormID.BIBLEUTILS)
+        r1.append(None)
+        r2 = parse_refs('Gen 1:1', ReferenceFormID.BIBLEUTILS)
+        self.assertEqual(len(r2), 1, 'cached result was modified by a caller')
+
+    def testParseRefsMany(self):
+        r = parse_refs_many(iter(['Gen 1:1', 'Ex 2-3', 'Lev 4']),
+                            ReferenceFormID.BIBLEUTILS)
+        self.assertIsInstance(r, types.GeneratorType, 'not a generator')
+        r = list(r)
+        self.assertTrue(all(isinstance(x, ParseResult) for x in r),
+                        'results are not ParseResults by default')
+        r = [x.refs for x in r]
+        self.assertEqual([x[0].st_book for x in r],
+                         [BookID._GENESIS, BookID._EXODUS, BookID._LEVITICUS],
+                         'results not in input order')
+        self.assertEqual(r[1][0].end_ch, 3, 'incorrect ending chapter')
+
+    def testParseRefsManyStrict(self):
+        r = parse_refs_many(['Gen 1:1', 'Exodus--Numbers', 'Lev 4'],
+                            ReferenceFormID.BIBLEUTILS, errors='strict')
+        self.assertEqual(next(r)[0].st_book, BookID._GENESIS, 'wrong book id')
+        with self.assertRaises(VersificationException):
+            next(r)
+
+    def testParseRefsManySkip(self):
+        r = list(parse_refs_many(['Gen 1:1', 'Exodus--Numbers', 'Lev 4'],
+                                 ReferenceFormID.BIBLEUTILS, errors='skip'))
+        self.assertEqual([x[0].st_book for x in r],
+                         [BookID._GENESIS, BookID._LEVITICUS],
+                         'invalid reference not skipped')
+
+    def testParseRefsManyCollect(self):
+        r = list(parse_refs_many(['Gen 1:1', 'Exodus--Numbers', 'Lev 4'],
+                                 ReferenceFormID.BIBLEUTILS, errors='collect'))
+        self.assertEqual(len(r), 3, 'incorrect number of results')
+        self.assertIsInstance(r[1], VersificationException,
+                              'error not collected in place')
+        self.assertEqual(r[1].message,
+                         'invalid book name at pos 7 in Exodus--Numbers')
+
+    def testParseRefsManyBadMode(self):
+        with self.assertRaises(VersificationException):
+            list(parse_refs_many(['Gen 1:1'], ReferenceFormID.BIBLEUTILS,
+                                 errors='ignore'))
+
+    def testBookIDFromStrPrefix(self):
+        self.assertEqual(BookID.fromStr('gen'), BookID._GENESIS, 'wrong book id')
+        self.assertEqual(BookID.fromStr('EXODUS'), BookID._EXODUS, 'wrong book id')
+        self.assertEqual(BookID.fromStr('Song_of'), BookID._SONG_OF_SONGS,
+                         'wrong book id')
+        self.assertIsNone(BookID.fromStr('Gex'), 'unknown name resolved')
+        self.assertIsNone(BookID.fromStr(''), 'empty name resolved')
+        self.assertIsNone(BookID.fromStr(None), 'None resolved')
+
+    def testBookIDFromStrAmbiguous(self):
+        self.assertEqual(BookID.fromStr('J'), BookID._JOSHUA, 'wrong book id')
+        self.assertEqual(BookID.fromStr('Ph'), BookID._PHILIPPIANS,
+                         'wrong book id')
+        self.assertEqual(BookID.candidates('Ph'),
+                         (BookID._PHILIPPIANS, BookID._PHILEMON),
+                         'wrong candidates')
+        self.assertEqual(BookID.candidates('Phile'), (BookID._PHILEMON,),
+                         'wrong candidates')
+        self.assertEqual(BookID.candidates('Gex'), (), 'wrong candidates')
+
+    def testBookIDFromStrExactFirst(self):
+        self.assertEqual(BookID.candidates('esther'),
+                         (BookID._ESTHER, BookID._ESTHER_APOC),
+                         'wrong candidates')
+        self.assertEqual(BookID.fromStr('Daniel'), BookID._DANIEL,
+                         'wrong book id')
+
+    def testBookIDsImmutable(self):
+        with self.assertRaises(AttributeError):
+            BookID._GENESIS = 12
+        with self.assertRaises(AttributeError):
+            del BookID._GENESIS
+        self.assertEqual(BookID._GENESIS, 1, 'constant was modified')
+
+    def testReferenceFormIDs(self):
+        self.assertEqual(ReferenceFormID.BIBLEUTILS, 0, 'wrong form id')
+        self.assertEqual(ReferenceFormID.ETCBCG, 1, 'wrong form id')
+        self.assertEqual(ReferenceFormID.ETCBCH, 2, 'wrong form id')
+        self.assertEqual(list(ReferenceFormID),
+                         ['BIBLEUTILS', 'ETCBCG', 'ETCBCH', 'IGNTPSinaiticus',
+                          'Accordance'],
+                         'wrong iteration order')
+
+    def testRefSlots(self):
+        r = Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=1, sv=1)
+        self.assertFalse(hasattr(r, '__dict__'), 'Ref has a __dict__')
+        with self.assertRaises(AttributeError):
+            r.st_book = BookID._EXODUS
+
+    def testRefImmutable(self):
+        r = Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=1, sv=1)
+        h = hash(r)
+        for name in Ref.__slots__ + ('extra',):
+            with self.assertRaises(AttributeError, msg=f'{name} assigned'):
+                setattr(r, name, 2)
+        with self.assertRaises(AttributeError):
+            del r._st_ch
+        self.assertEqual((hash(r), r.st_ch), (h, 1), 'ref changed')
+        self.assertEqual(pickle.loads(pickle.dumps(r)), r,
+                         'ref not pickled')
+
+    def testRefEqualityAndHash(self):
+        r1 = parse_refs('Gen 1:1-3', ReferenceFormID.BIBLEUTILS)[0]
+        r2 = Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=1, sv=1, ev=3)
+        r3 = Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=1, sv=1, ev=4)
+        self.assertEqual(r1, r2, 'equal refs compare unequal')
+        self.assertNotEqual(r1, r3, 'unequal refs compare equal')
+        self.assertEqual(len({r1, r2, r3}), 2, 'refs hash incorrectly')
+        self.assertEqual({r1 : 'a'}[r2], 'a', 'ref not usable as a dict key')
+
+    def testRefOrdering(self):
+        refs = [Ref(ReferenceFormID.BIBLEUTILS, BookID._EXODUS, sc=1),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=2, sv=1),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=1, sv=5),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=1, sv=5, ev=6),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=1)]
+        self.assertEqual(sorted(refs),
+                         [refs[4], refs[2], refs[3], refs[1], refs[0]],
+                         'refs sorted incorrectly')
+
+    def testRefPack(self):
+        refs = [Ref(ReferenceFormID.BIBLEUTILS, BookID._MARK, sc=16, sv=9, ev=20),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._EXODUS, BookID._NUMBERS),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._PSALMS, sc=119, sv=176,
+                    ssv='a', esv='c')]
+        for r in refs:
+            self.assertEqual(Ref.unpack(ReferenceFormID.BIBLEUTILS, r.pack()), r,
+                             f'pack does not round trip {r}')
+        self.assertEqual(sorted(refs, key=Ref.pack), sorted(refs),
+                         'packed order differs from Ref order')
+
+    def testRefPackNames(self):
+        with self.assertRaises(VersificationException):
+            Ref(ReferenceFormID.ETCBCH, 'Exodus', sc=1).pack()
+
+    def testRefAcrossBooks(self):
+        r = Ref(ReferenceFormID.ETCBCG, 'Matthew', 'Mark', sc=28, ec=1,
+                sv=19, ev=3)
+        self.assertEqual((r.st_ch, r.end_ch, r.st_vs, r.end_vs), (28, 1, 19, 3),
+                         'cross book reference altered')
+        r = Ref(ReferenceFormID.ETCBCG, 'Matthew', sc=27, ec=28, sv=19, ev=3)
+        self.assertEqual(r.end_vs, 3, 'cross chapter reference altered')
+
+    def testIterExpandRefs(self):
+        refs = [Ref(ReferenceFormID.ETCBCH, 'Genesis', 'Chronica_II')]
+        e_refs = iter_expand_refs(refs)
+        self.assertIsInstance(e_refs, types.GeneratorType, 'not a generator')
+        self.assertEqual(next(e_refs), Ref(ReferenceFormID.ETCBCH, 'Genesis',
+                                           sc=1, sv=1), 'wrong first verse')
+        self.assertEqual(next(e_refs).st_vs, 2, 'wrong second verse')
+
+    def testCountVerses(self):
+        refs = [Ref(ReferenceFormID.ETCBCH, 'Deuteronomium', sc=3, ec=4,
+                    sv=4, ev=6),
+                Ref(ReferenceFormID.ETCBCH, 'Exodus', sc=6, sv=1, ev=7),
+                Ref(ReferenceFormID.ETCBCH, 'Obadia', 'Jona'),
+                Ref(ReferenceFormID.ETCBCH, 'Psalmi', sc=119),
+                Ref(ReferenceFormID.ETCBCG, 'Matthew', 'Mark', sc=28, ec=1,
+                    sv=19, ev=3),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=1, sv=3,
+                    ev=9)]
+        for r in refs:
+            self.assertEqual(count_verses([r]), len(expand_refs([r])),
+                             f'wrong verse count for {r}')
+        self.assertEqual(count_verses(refs), len(expand_refs(refs)),
+                         'wrong verse count')
+
+    def testCountVersesWholeBible(self):
+        refs = [Ref(ReferenceFormID.ETCBCH, 'Genesis', 'Chronica_II')]
+        self.assertEqual(count_verses(refs), 23213, 'wrong verse count')
+
+    def testCountVersesBadVerse(self):
+        with self.assertRaises(VersificationException) as expected_ex:
+            count_verses([Ref(ReferenceFormID.ETCBCH, 'Genesis', sc=1, sv=1,
+                              ev=32)])
+
+        ex = expected_ex.exception
+        self.assertEqual(ex.message, 'verse 32 is not in chapter 1 of book Genesis')
+
+    def testRefSetCoalesce(self):
+        refs = parse_refs('Gen 1:1-5, Gen 1:3-10, Gen 1:11, Ex 1:1-22',
+                          ReferenceFormID.BIBLEUTILS)
+        refs += parse_refs('Gen 2', ReferenceFormID.BIBLEUTILS)
+        rs = RefSet(ETCBCHVersification, refs)
+        self.assertEqual(list(rs),
+                         [Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS,
+                              sc=1, sv=1, ev=11),
+                          Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS,
+                              sc=2, sv=1, ev=25),
+                          Ref(ReferenceFormID.BIBLEUTILS, BookID._EXODUS,
+                              sc=1, sv=1, ev=22)],
+                         'ranges not coalesced')
+        self.assertEqual(rs.verse_count(), 11 + 25 + 22, 'wrong verse count')
+
+    def testRefSetSpansChapters(self):
+        rs = RefSet(ETCBCHVersification,
+                    parse_refs('Gen 1', ReferenceFormID.BIBLEUTILS) +
+                    parse_refs('Gen 2:1-3', ReferenceFormID.BIBLEUTILS))
+        self.assertEqual(list(rs),
+                         [Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS,
+                              sc=1, ec=2, sv=1, ev=3)],
+                         'adjacent chapters not coalesced')
+
+    def testRefSetContains(self):
+        rs = RefSet(ETCBCHVersification,
+                    parse_refs('Gen 1:1-5, Ex 2-3', ReferenceFormID.BIBLEUTILS))
+        self.assertIn(parse_refs('Gen 1:2-4', ReferenceFormID.BIBLEUTILS)[0], rs,
+                      'contained range not found')
+        self.assertIn(Ref(ReferenceFormID.ETCBCH, 'Exodus', sc=2, ec=3, sv=20,
+                          ev=4), rs, 'contained range not found')
+        self.assertNotIn(parse_refs('Gen 1:4-6', ReferenceFormID.BIBLEUTILS)[0],
+                         rs, 'partially contained range found')
+        self.assertTrue(rs.overlaps(parse_refs('Gen 1:4-6',
+                                               ReferenceFormID.BIBLEUTILS)[0]),
+                        'overlapping range not found')
+        self.assertFalse(rs.overlaps(parse_refs('Gen 1:6-9',
+                                                ReferenceFormID.BIBLEUTILS)[0]),
+                         'disjoint range overlaps')
+
+    def testRefSetOperations(self):
+        random.seed(7)
+        vf = ETCBCHVersification
+
+        def random_refs():
+            refs = []
+            for _ in range(30):
+                ch = random.randint(1, 3)
+                sv = random.randint(1, 20)
+                refs.append(Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS,
+                                sc=ch, sv=sv, ev=sv + random.randint(0, 4)))
+            return refs
+
+        def verses(rs):
+            return {(r.st_ch, r.st_vs) for r in expand_refs(list(rs), vf)}
+
+        for _ in range(20):
+            (a, b) = (RefSet(vf, random_refs()), RefSet(vf, random_refs()))
+            self.assertEqual(verses(a | b), verses(a) | verses(b), 'bad union')
+            self.assertEqual(verses(a & b), verses(a) & verses(b),
+                             'bad intersection')
+            self.assertEqual(verses(a - b), verses(a) - verses(b),
+                             'bad difference')
+            self.assertEqual(RefSet(vf, list(a | b)), a | b,
+                             'union not coalesced')
+
+    def testRefSetDifferentVersifications(self):
+        with self.assertRaises(VersificationException):
+            RefSet(ETCBCHVersification) | RefSet(ETCBCGVersification)
+
+    def testVerseMap(self):
+        m = ETCBCHToETCBCGVerseMap
+        self.assertEqual(m.map_verse('Genesis', 1, 1), ((BookID._GENESIS, 1, 1),),
+                         'wrong identical verse')
+        self.assertEqual(m.map_verse('Genesis', 32, 1),
+                         ((BookID._GENESIS, 31, 55),), 'wrong shifted verse')
+        self.assertEqual(m.map_verse(BookID._EXODUS, 21, 37),
+                         ((BookID._EXODUS, 22, 1),), 'wrong shifted verse')
+        self.assertEqual(m.map_verse('Leviticus', 1, 1), (),
+                         'verse mapped to a system without the book')
+        self.assertEqual(ETCBCGToETCBCHVerseMap.map_verse('Exodus', 8, 4),
+                         ((BookID._EXODUS, 7, 29),), 'wrong inverse verse')
+
+    def testVerseMapSplitMerge(self):
+        m = VerseMap(ETCBCHVersification, ETCBCGVersification,
+                     [((BookID._GENESIS, 1, 1, 1), (BookID._GENESIS, 1, 1, 2)),
+                      ((BookID._GENESIS, 1, 2, 3), (BookID._GENESIS, 1, 3, 3))])
+        self.assertEqual(m.map_verse('Genesis', 1, 1),
+                         ((BookID._GENESIS, 1, 1), (BookID._GENESIS, 1, 2)),
+                         'verse not split')
+        self.assertEqual(m.map_verse('Genesis', 1, 2), ((BookID._GENESIS, 1, 3),),
+                         'verses not merged')
+        self.assertEqual(m.map_verse('Genesis', 1, 3), ((BookID._GENESIS, 1, 3),),
+                         'verses not merged')
+        inv = m.inverse()
+        self.assertEqual(inv.map_verse('Genesis', 1, 2), ((BookID._GENESIS, 1, 1),),
+                         'split not inverted')
+        self.assertEqual(inv.map_verse('Genesis', 1, 3),
+                         ((BookID._GENESIS, 1, 2), (BookID._GENESIS, 1, 3)),
+                         'merge not inverted')
+        self.assertEqual(map_refs(parse_refs('Gen 1:1', ReferenceFormID.BIBLEUTILS), m),
+                         [Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS,
+                              sc=1, sv=1, ev=2)], 'split verse not mapped to a range')
+
+    def testMapRefs(self):
+        refs = [Ref(ReferenceFormID.ETCBCH, 'Genesis', sc=31, ec=32, sv=50, ev=3),
+                Ref(ReferenceFormID.ETCBCH, 'Exodus', sc=8)]
+        self.assertEqual(map_refs(refs, ETCBCHToETCBCGVerseMap,
+                                  ReferenceFormID.ETCBCG),
+                         [Ref(ReferenceFormID.ETCBCG, 'Genesis', sc=31, ec=32,
+                              sv=50, ev=2),
+                          Ref(ReferenceFormID.ETCBCG, 'Exodus', sc=8, sv=5,
+                              ev=32)],
+                         'wrong mapped refs')
+        with self.assertRaises(VersificationException):
+            map_refs([Ref(ReferenceFormID.ETCBCH, 'Leviticus', sc=1)],
+                     ETCBCHToETCBCGVerseMap)
+
+    def testMapRefsWholeBooks(self):
+        refs = [Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, None, c, None, v)
+                for c in range(1, 51)
+                for v in range(1, ETCBCHVersification.verse_count(1, c) + 1)]
+        mapped = map_refs(refs, ETCBCHToETCBCGVerseMap)
+        self.assertEqual(len(set(mapped)), len(refs), 'verses not mapped uniquely')
+        self.assertEqual(map_refs(mapped, ETCBCGToETCBCHVerseMap), refs,
+                         'mapping does not round trip')
+
+    def testConvertBetweenForms(self):
+        refs = [Ref(ReferenceFormID.ETCBCH, 'Genesis', sc=1, sv=1),
+                Ref(ReferenceFormID.ETCBCH, 'Deuteronomium', sc=3, sv=4),
+                Ref(ReferenceFormID.ETCBCG, 'Mark', 'Mark', 1, sv=12, ev=15)]
+        c_refs = convert_refs(refs, ReferenceFormID.ETCBCG)
+        self.assertEqual(len(c_refs), 3, 'refs dropped in conversion')
+        self.assertEqual([r.versification for r in c_refs],
+                         [ReferenceFormID.ETCBCG] * 3,
+                         'Incorrect reference form')
+        self.assertEqual([r.st_book for r in c_refs],
+                         ['Genesis', None, 'Mark'],
+                         'Conversion returned wrong names')
+        self.assertEqual(c_refs[2].end_vs, 15,
+                         f'Conversion returned wrong vs {c_refs[2].end_vs}')
+        c_refs = convert_refs(refs, ReferenceFormID.ETCBCH)
+        self.assertEqual([r.st_book for r in c_refs],
+                         ['Genesis', 'Deuteronomium', None],
+                         'Conversion returned wrong names')
+    
+    def testConvertUnregisteredForm(self):
+        refs = [Ref(ReferenceFormID.ETCBCG, 'Luke', sc=3, sv=4)]
+        with self.assertRaises(VersificationException) as e:
+            convert_refs(refs, 99)
+        self.assertEqual(e.exception.message, 'unsupported conversion form 99')
+        refs = [Ref(99, 'Luke', sc=3, sv=4)]
+        with self.assertRaises(VersificationException) as e:
+            convert_refs(refs, ReferenceFormID.BIBLEUTILS)
+        self.assertEqual(e.exception.message, 'unsupported conversion form 99')
+    
+    def _keep_registry(self):
+        # Restore the registered reference forms when the test ends
+        vs = bibleutils.versification
+        saved = [(d, dict(d)) for d in (vs._form_versifications,
+                                        vs._form_book_names, vs._lazy_forms)]
+        def restore():
+            for (d, items) in saved:
+                d.clear()
+                d.update(items)
+            for cache in vs._registry_caches:
+                cache.clear()
+        self.addCleanup(restore)
+    
+    def testRegisterVersification(self):
+        vf = Versification(VersificationID.Accordance,
+                           {'Gen' : BookID._GENESIS, 'Mk' : BookID._MARK},
+                           {'Gen' : [31, 25]})
+        self._keep_registry()
+        register_versification(ReferenceFormID.Accordance, vf)
+        self.assertIs(get_versification(ReferenceFormID.Accordance), vf,
+                      'wrong versification registered')
+        refs = [Ref(ReferenceFormID.ETCBCG, 'Mark', sc=1, sv=2),
+                Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, sc=2, sv=3)]
+        c_refs = convert_refs(refs, ReferenceFormID.Accordance)
+        self.assertEqual([r.st_book for r in c_refs], ['Mk', 'Gen'],
+                         'Conversion returned wrong names')
+        c_refs = convert_refs(c_refs, ReferenceFormID.ETCBCH)
+        self.assertEqual([r.st_book for r in c_refs], [None, 'Genesis'],
+                         'Conversion returned wrong names')
+        self.assertEqual(count_verses([Ref(ReferenceFormID.Accordance, 'Gen',
+                                           'Gen', 1, 2, 31, 1)]), 2,
+                         'registered versification not used to expand')
+        
+        # Registering again replaces the names
+        register_versification(ReferenceFormID.Accordance,
+                               Versification(VersificationID.Accordance,
+                                             {'Mr' : BookID._MARK}))
+        c_refs = convert_refs(refs, ReferenceFormID.Accordance)
+        self.assertEqual([r.st_book for r in c_refs], ['Mr', None],
+                         'Conversion returned wrong names')
+    
+    def testRegisterInternalForm(self):
+        with self.assertRaises(VersificationException):
+            register_versification(ReferenceFormID.BIBLEUTILS,
+                                   ETCBCGVersification)
+        with self.assertRaises(VersificationException):
+            register_versification(ReferenceFormID.IGNTPSinaiticus, {})
+
+    def _run_python(self, *args):
+        # Run a fresh interpreter able to import bibleutils, writing bytecode
+        # to a private cache so that compilation does not count as import
+        env = dict(os.environ)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        env['PYTHONPYCACHEPREFIX'] = self._pycache.name
+        env['PYTHONPATH'] = os.pathsep.join(
+            [_PACKAGE_ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+        return subprocess.run([sys.executable] + list(args), env=env,
+                              capture_output=True, text=True, check=True)
+    
+    def testLazyConstruction(self):
+        self._pycache = tempfile.TemporaryDirectory()
+        self.addCleanup(self._pycache.cleanup)
+        out = self._run_python('-c', 
+            'import bibleutils.versification as v;'
+            'print(sorted(n for n in v._LAZY_ATTRIBUTES if n in vars(v)));'
+            'v.convert_refs([], v.ReferenceFormID.ETCBCH);'
+            'print(sorted(n for n in v._LAZY_ATTRIBUTES if n in vars(v)))')
+        self.assertEqual(out.stdout.split('\n')[:2],
+                         ['[]', "['ETCBCHVersification']"],
+                         'tables built before first use')
+        self.assertIs(ETCBCHVersification,
+                      get_versification(ReferenceFormID.ETCBCH),
+                      'lazy attribute differs from registered versification')
+        self.assertIn('ETCBCGToETCBCHVerseMap', dir(bibleutils.versification),
+                      'lazy attribute missing from dir()')
+        self.assertIn('ETCBCGToETCBCHVerseMap',
+                      bibleutils.versification.__all__,
+                      'lazy attribute missing from __all__')
+        for name in ('re', 'heapq', 'namedtuple', 'lru_cache'):
+            self.assertNotIn(name, bibleutils.versification.__all__,
+                             f'imported name {name} in __all__')
+        with self.assertRaises(AttributeError):
+            bibleutils.versification.ETCBCXVersification
+    
+    def testImportTimeBudget(self):
+        self._pycache = tempfile.TemporaryDirectory()
+        self.addCleanup(self._pycache.cleanup)
+        stmt = 'import bibleutils.versification'
+        self._run_python('-c', stmt)
+        best = None
+        for _ in range(3):
+            out = self._run_python('-X', 'importtime', '-c', stmt)
+            for line in out.stderr.splitlines():
+                fields = line.split('|')
+                if fields[-1].strip() == 'bibleutils.versification':
+                    us = int(fields[0].split(':')[1])
+                    best = us if best is None else min(best, us)
+        self.assertIsNotNone(best, 'no import time reported')
+        self.assertLess(best, _IMPORT_BUDGET_US,
+                        f'import took {best} us, over the budget of '
+                        f'{_IMPORT_BUDGET_US} us')
+
+    def testVerseOrdinals(self):
+        vf = ETCBCHVersification
+        self.assertEqual(vf.verse_ordinal(BookID._GENESIS, 1, 1), 0,
+                         'wrong first ordinal')
+        self.assertEqual(vf.verse_ordinal('Genesis', 2, 1), 31,
+                         'wrong ordinal of named book')
+        self.assertEqual(vf.verse_at(31), (BookID._GENESIS, 2, 1),
+                         'wrong verse at ordinal')
+        self.assertEqual(vf.verse_total(), 23213, 'wrong verse total')
+        for o in range(0, vf.verse_total(), 7):
+            self.assertEqual(vf.verse_ordinal(*vf.verse_at(o)), o,
+                             f'ordinal {o} does not round trip')
+        self.assertEqual(vf.verse_at(vf.verse_total() - 1),
+                         (BookID._2CHRONICLES, 36, 23), 'wrong last verse')
+        
+    def testVerseOrdinalBounds(self):
+        vf = ETCBCHVersification
+        for (args, msg) in (((BookID._GENESIS, 51, 1),
+                             'chapter 51 is not in book Genesis'),
+                            ((BookID._GENESIS, 1, 32),
+                             'verse 32 is not in chapter 1 of book Genesis'),
+                            ((BookID._MATTHEW, 1, 1),
+                             f'unknown book {BookID._MATTHEW}')):
+            with self.assertRaises(VersificationException) as e:
+                vf.verse_ordinal(*args)
+            self.assertEqual(e.exception.message, msg, 'wrong error')
+        for o in (-1, vf.verse_total(), None):
+            with self.assertRaises(VersificationException):
+                vf.verse_at(o)
+    
+    def testRefOrdinals(self):
+        vf = ETCBCHVersification
+        refs = parse_refs('Gen 1-2', ReferenceFormID.BIBLEUTILS) + \
+            parse_refs('Gen 2:3', ReferenceFormID.BIBLEUTILS)
+        self.assertEqual(vf.ref_ordinals(refs[0]), (0, 55),
+                         'wrong range ordinals')
+        self.assertEqual(vf.ref_ordinal(refs[1]), 33, 'wrong verse ordinal')
+        with self.assertRaises(VersificationException):
+            vf.ref_ordinal(refs[0])
+        self.assertEqual(vf.ordinal_ref(33), refs[1], 'wrong ref of ordinal')
+        self.assertEqual(vf.ordinal_ref(33, ReferenceFormID.ETCBCH),
+                         Ref(ReferenceFormID.ETCBCH, 'Genesis', sc=2, sv=3),
+                         'wrong named ref of ordinal')
+
+    def testRefOrdinalsRejected(self):
+        vf = ETCBCHVersification
+        B = ReferenceFormID.BIBLEUTILS
+        for (r, msg) in (
+                (Ref(B, BookID._GENESIS, BookID._GENESIS, None, 1, 7, 6),
+                 f'reference {Ref(B, 1, 1, None, 1, 7, 6)} ends before it '
+                 f'starts'),
+                (Ref(B, BookID._GENESIS, None, 0, 2),
+                 'chapter 0 is not in book Genesis'),
+                (Ref(B, BookID._GENESIS, None, 1, 2, 0, 3),
+                 'verse 0 is not in chapter 1 of book Genesis')):
+            for check in (vf.ref_ordinals, lambda r: validate_ref(r, vf),
+                          lambda r: expand_refs([r], vf)):
+                with self.assertRaises(VersificationException) as e:
+                    check(r)
+                self.assertEqual(e.exception.message, msg, 'wrong error')
+
+    def testVerseSet(self):
+        vf = ETCBCHVersification
+        vs = VerseSet(vf, parse_refs('Gen 1:1-5, Exod 2', 
+                                     ReferenceFormID.BIBLEUTILS))
+        self.assertEqual(len(vs), 5 + 25, 'wrong verse count')
+        self.assertIn(parse_refs('Gen 1:2-4', ReferenceFormID.BIBLEUTILS)[0],
+                      vs, 'contained range not in set')
+        r = parse_refs('Gen 1:5-6', ReferenceFormID.BIBLEUTILS)[0]
+        self.assertNotIn(r, vs, 'partly contained range in set')
+        self.assertTrue(vs.overlaps(r), 'overlapping range does not overlap')
+        vs.update(expand_refs([r], vf))
+        self.assertIn(r, vs, 'added verses not in set')
+        self.assertEqual(list(vs)[:2],
+                         [Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS,
+                              sc=1, sv=1),
+                          Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS,
+                              sc=1, sv=2)], 'wrong iteration')
+        self.assertEqual(vs.to_refset(),
+                         RefSet(vf, parse_refs('Gen 1:1-6, Exod 2',
+                                               ReferenceFormID.BIBLEUTILS)),
+                         'wrong ranges')
+        self.assertEqual(list(vs.ordinals())[:7], [0, 1, 2, 3, 4, 5,
+                          vf.verse_ordinal(BookID._EXODUS, 2, 1)],
+                         'wrong ordinals')
+        
+    def testVerseSetOperations(self):
+        vf = ETCBCHVersification
+        def verses(refs):
+            return VerseSet(vf, parse_refs(refs, ReferenceFormID.BIBLEUTILS))
+        a = verses('Gen 1:1-10')
+        b = verses('Gen 1:5-20')
+        self.assertEqual(a | b, verses('Gen 1:1-20'), 'wrong union')
+        self.assertEqual(a & b, verses('Gen 1:5-10'), 'wrong intersection')
+        self.assertEqual(a - b, verses('Gen 1:1-4'), 'wrong difference')
+        self.assertEqual(a ^ b, verses('Gen 1:1-4,11-20'),
+                         'wrong symmetric difference')
+        self.assertFalse(a - a, 'empty set is true')
+        self.assertEqual(len(VerseSet(vf, parse_refs('Gen-Deut',
+                                     ReferenceFormID.BIBLEUTILS))),
+                         5853, 'wrong count of the Torah')
+        with self.assertRaises(VersificationException):
+            a | VerseSet(ETCBCGVersification)
+
+    
+    def testValidateRef(self):
+        vf = ETCBCHVersification
+        B = ReferenceFormID.BIBLEUTILS
+        for r in (Ref(B, BookID._GENESIS, None, 50, None, 26),
+                  Ref(B, BookID._GENESIS, BookID._EXODUS, 50, 1, 26, 3),
+                  Ref(B, BookID._GENESIS, None, 1, None, 1, None, 'a', 'c'),
+                  Ref(ReferenceFormID.ETCBCH, 'Genesis', None, 3)):
+            validate_ref(r, None if r.versification else vf)
+        for (r, msg) in (
+                (Ref(B, BookID._GENESIS, None, 51, None, 1),
+                 'chapter 51 is not in book Genesis'),
+                (Ref(B, BookID._JUDE, None, 2, None, 1),
+                 f'unknown book {BookID._JUDE}'),
+                (Ref(B, BookID._EXODUS, BookID._GENESIS, 1, 1, 1, 1),
+                 f'ending book {BookID._GENESIS} is before the starting book '
+                 f'{BookID._EXODUS}'),
+                (Ref(B, BookID._GENESIS, None, 0, None, 1),
+                 'chapter 0 is not in book Genesis'),
+                (Ref(B, BookID._GENESIS, None, 1, None, 1, None, 'c', 'a'),
+                 f'invalid reference '
+                 f'{Ref(B, BookID._GENESIS, None, 1, None, 1, None, "c", "a")}')):
+            with self.assertRaises(VersificationException) as e:
+                validate_ref(r, vf)
+            self.assertEqual(e.exception.message, msg, 'wrong error')
+        with self.assertRaises(VersificationException):
+            validate_ref(Ref(B, BookID._GENESIS, None, 1))
+        
+    def testValidateRefs(self):
+        vf = ETCBCHVersification
+        B = ReferenceFormID.BIBLEUTILS
+        refs = [Ref(B, BookID._GENESIS, None, 1, None, 1),
+                Ref(B, BookID._MATTHEW, None, 1),
+                Ref(B, BookID._EXODUS, BookID._GENESIS),
+                Ref(B, BookID._GENESIS, None, 51),
+                Ref(B, BookID._GENESIS, None, 1, None, 32),
+                Ref(B, BookID._GENESIS, None, 1, None, None, None, 'a'),
+                Ref(B, BookID._GENESIS, None, 1, None, 1, None, 'A')]
+        (valid, statuses) = validate_refs(refs, vf)
+        self.assertEqual(valid, [True] + [False] * 6, 'wrong validity')
+        self.assertEqual(statuses,
+                         [RefStatusID.VALID, RefStatusID.UNKNOWN_BOOK,
+                          RefStatusID.BOOK_ORDER, RefStatusID.CHAPTER_RANGE,
+                          RefStatusID.VERSE_RANGE, RefStatusID.SUB_VERSE,
+                          RefStatusID.SUB_VERSE], 'wrong statuses')
+        for (r, ok) in zip(refs, valid):
+            if ok:
+                validate_ref(r, vf)
+            else:
+                with self.assertRaises(VersificationException):
+                    validate_ref(r, vf)
+        self.assertEqual(validate_refs([], vf), ([], []),
+                         'wrong result of no refs')
+
+    
+    def testParseResult(self):
+        parser = RefParser()
+        r = parser.parse_result(' Gen 1:1-3 ', ReferenceFormID.BIBLEUTILS)
+        self.assertTrue(r.ok, 'valid reference reported in error')
+        self.assertIsNone(r.exception(), 'exception of a valid result')
+        self.assertIs(r.refs, parser.parse('Gen 1:1-3',
+                                           ReferenceFormID.BIBLEUTILS),
+                      'result not shared with the cache')
+        bad = [('Exodus--Numbers', 7), ('Gen 3-2', 7), ('Gen:1', 4),
+               ('Gen 1:1-2--', 10)]
+        for (refs, pos) in bad:
+            r = parser.parse_result(refs, ReferenceFormID.BIBLEUTILS)
+            self.assertFalse(r.ok, f'{refs} did not fail')
+            self.assertIsNone(r.refs, 'refs of a failed result')
+            self.assertEqual(r.error.position, pos, 'wrong error position')
+            with self.assertRaises(VersificationException) as e:
+                parser.parse(refs, ReferenceFormID.BIBLEUTILS)
+            self.assertEqual((e.exception.message, e.exception.reason,
+                              e.exception.action), r.error[1:],
+                             'result differs from the exception raised')
+        self.assertEqual(parser.cache_info().currsize, 1 + len(bad),
+                         'errors were not cached')
+        hits = parser.cache_info().hits
+        self.assertFalse(parser.parse_result(bad[0][0],
+                                             ReferenceFormID.BIBLEUTILS).ok,
+                         'cached error parsed')
+        self.assertEqual(parser.cache_info().hits, hits + 1,
+                         'repeated error was parsed again')
+        self.assertEqual(parser.parse_result('Gen:1', 0).error.reason,
+                         'expected to find verse but did not', 'wrong reason')
+    
+    def testParseRefsManyResult(self):
+        r = list(parse_refs_many(['Gen 1:1', 'Exodus--Numbers', 'Lev 4'],
+                                 ReferenceFormID.BIBLEUTILS, errors='result'))
+        self.assertEqual([x.ok for x in r], [True, False, True],
+                         'wrong results')
+        self.assertEqual(r[2].refs[0].st_book, BookID._LEVITICUS,
+                         'wrong book id')
+        self.assertEqual(r[1].error.message,
+                         'invalid book name at pos 7 in Exodus--Numbers')
+
+    
+    def testFastParserMatchesStateMachine(self):
+        # The fast parser must accept exactly the strings the state machine
+        # accepts, with the same refs, and leave the errors to it
+        vs = bibleutils.versification
+        pieces = ['Gen', 'gen.', '1Sam', 'Ex', 'Exodus', 'Rev', '2', '12',
+                  '3', ':', ',', '-', ' ', '  ', ', ', ' - ', ': ', '+', 'a',
+                  '1a', '.', 'x', 'é', ';', '; ', 'SONG_OF_SONGS', '_']
+        rng = random.Random(0)
+        strings = ['', 'Gen 1:1-2,6, Ex 17:3', 'Gen 1:1, Exod 2', 'Gen 1 2',
+                   'Gen 1:1-Exod 2', 'Gen 1:1, 2:3', 'Gen - Exod, Lev 1',
+                   'Gen 1:1-3,5; 2:4; Exod 3-4', 'Gen; 1Sam 2; 3:1']
+        strings += [''.join(rng.choice(pieces)
+                            for _ in range(rng.randint(1, 9)))
+                    for _ in range(20000)]
+        fast = 0
+        for s in strings:
+            refs = vs._parse_fast(s)
+            result = vs._parse_result(s)
+            if refs is None:
+                self.assertFalse(result.ok, f'fast parser rejected {s!r}')
+            else:
+                fast += 1
+                self.assertEqual(refs, result.refs, f'refs differ for {s!r}')
+        self.assertGreater(fast, 1000, 'too few valid strings generated')
+
+    
+    def testParseFormNames(self):
+        H = ReferenceFormID.ETCBCH
+        self.assertEqual(parse_refs('Numeri 1:1; Samuel_I 2', H),
+                         [Ref(ReferenceFormID.BIBLEUTILS, BookID._NUMBERS,
+                              None, 1, None, 1),
+                          Ref(ReferenceFormID.BIBLEUTILS, BookID._1SAMUEL,
+                              None, 2)], 'names of the form not read')
+        for (refs, form) in (('Numeri 1:1', ReferenceFormID.BIBLEUTILS),
+                             ('Xyz 1:1', H), ('Gen-Xyz', H)):
+            with self.assertRaises(VersificationException) as e:
+                parse_refs(refs, form)
+            self.assertEqual(e.exception.reason, 'book name is invalid',
+                             f'unknown book in {refs} not rejected')
+
+    def testFormatRef(self):
+        H = ReferenceFormID.ETCBCH
+        for (refs, expected) in (('Gen 1:1-3', 'Genesis 1:1-3'),
+                                 ('Gen 1-2', 'Genesis 1-2'),
+                                 ('Gen 1:3', 'Genesis 1:3'),
+                                 ('Gen', 'Genesis'),
+                                 ('Gen - Exod', 'Genesis-Exodus')):
+            r = parse_refs(refs, ReferenceFormID.BIBLEUTILS)[0]
+            self.assertEqual(format_ref(r, H), expected, 'wrong string')
+            self.assertEqual(parse_refs(format_ref(r), 0)[0], r,
+                             'string does not parse back')
+        r = Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS, BookID._EXODUS,
+                1, 2, 3, 4, 'a')
+        self.assertEqual(format_ref(r), 'GENESIS 1:3a-EXODUS 2:4',
+                         'wrong string of the internal form')
+        self.assertEqual(format_ref(convert_refs([r], H)[0]),
+                         'Genesis 1:3a-Exodus 2:4', 'wrong string of own form')
+        with self.assertRaises(VersificationException) as e:
+            format_ref(parse_refs('Matt 1', 0)[0], H)
+        self.assertEqual(e.exception.message,
+                         f'book {BookID._MATTHEW} has no name in reference '
+                         'form ETCBCH', 'wrong error')
+    
+    def testFormatRefs(self):
+        refs = [r for s in ('Gen 1:1', 'Gen 1:2-3', 'Gen 1:5', 'Gen 2:4',
+                            'Gen 2:2-6', 'Exod 3', 'Exod 4-5', 'Exod 5:1',
+                            'Exod 6:1-7:2', 'Lev 1', 'Lev 3')
+                for r in parse_refs(s, ReferenceFormID.BIBLEUTILS)]
+        refs[8] = Ref(ReferenceFormID.BIBLEUTILS, BookID._EXODUS, None,
+                      6, 7, 1, 2)
+        self.assertEqual(format_refs(refs, ReferenceFormID.ETCBCH),
+                         'Genesis 1:1-3,5; 2:4,2-6; Exodus 3-5; 5:1; '
+                         'Exodus 6:1-7:2; Leviticus 1; 3', 'wrong compact string')
+        self.assertEqual(format_refs(refs[:3], style='separate'),
+                         'GENESIS 1:1, GENESIS 1:2-3, GENESIS 1:5',
+                         'wrong separate string')
+        self.assertEqual(format_refs([]), '', 'wrong string of no refs')
+        with self.assertRaises(VersificationException):
+            format_refs(refs, style='short')
+
+    def testSortRefs(self):
+        vf = Versification(VersificationID.Accordance,
+                           {'Exodus' : BookID._EXODUS,
+                            'Genesis' : BookID._GENESIS})
+        self.assertEqual(vf.book_order(), (BookID._EXODUS, BookID._GENESIS),
+                         'wrong book order')
+        self.assertEqual(vf.book_position('Genesis'), 1, 'wrong position')
+        self.assertEqual(vf.book_position(BookID._EXODUS), 0,
+                         'wrong position of book ID')
+        self.assertIsNone(vf.book_position(BookID._LEVITICUS),
+                          'position of book not in system')
+        refs = [r for s in ('Gen 2:1', 'Exod 3', 'Gen 1:2-3', 'Gen 1:2',
+                            'Gen 1:2-4', 'Lev 1', 'Gen 1', 'Exod 3')
+                for r in parse_refs(s, ReferenceFormID.BIBLEUTILS)]
+        self.assertEqual([str(r) for r in sort_refs(refs, vf)],
+                         [str(refs[i]) for i in (1, 7, 6, 3, 2, 4, 0, 5)],
+                         'wrong order in system')
+        self.assertEqual(sort_refs(refs, ETCBCHVersification)[:2],
+                         [refs[6], refs[3]], 'wrong canonical order')
+        self.assertTrue(vf.ref_sort_key(refs[1]) ==
+                        vf.ref_sort_key(Ref(ReferenceFormID.Accordance,
+                                            'Exodus', None, 3)),
+                        'keys of book ID and name differ')
+        with self.assertRaises(VersificationException):
+            sort_refs(refs)
+        etcbch = convert_refs(refs, ReferenceFormID.ETCBCH)
+        self.assertEqual(sort_refs(etcbch)[0].st_ch, 1, 'wrong default order')
+        self.assertEqual(dedupe_refs(refs), refs[:7], 'wrong de-duplication')
+        self.assertEqual(sort_refs([]), [], 'wrong sort of no refs')
+
+    def testStats(self):
+        parser = RefParser()
+        self.assertFalse(stats_enabled(), 'stats enabled by default')
+        reset_stats()
+        parser.parse('Gen 1:1', ReferenceFormID.BIBLEUTILS)
+        self.assertEqual(get_stats()['parse.calls'], 0,
+                         'counted while disabled')
+        with collect_stats() as stats:
+            self.assertTrue(stats_enabled(), 'not enabled in with')
+            parser.parse('Gen 1:1', ReferenceFormID.BIBLEUTILS)
+            parser.parse('Gen 1:1-3, Exod 2', ReferenceFormID.BIBLEUTILS)
+            parser.parse('Gen 1:1-3, Exod 2', ReferenceFormID.BIBLEUTILS)
+            self.assertFalse(parser.parse_result('Gen 1:1a',
+                ReferenceFormID.BIBLEUTILS).ok, 'parsed a sub-verse')
+            with self.assertRaises(VersificationException):
+                parser.parse('Gen 1:1a', ReferenceFormID.BIBLEUTILS)
+            refs = convert_refs(parser.parse('Gen 1:1-3',
+                ReferenceFormID.BIBLEUTILS), ReferenceFormID.ETCBCH)
+            expand_refs(refs)
+            with self.assertRaises(VersificationException):
+                convert_refs(refs, 99)
+        self.assertFalse(stats_enabled(), 'not disabled after with')
+        self.assertEqual(sorted(stats), sorted(get_stats()), 'wrong names')
+        expected = {'parse.calls' : 6, 'parse.items' : 6, 'parse.errors' : 2,
+                    'parse.cache_hits' : 3, 'parse.cache_misses' : 3,
+                    'parse.fast' : 2, 'parse.fallback' : 1,
+                    'convert.calls' : 2, 'convert.items' : 1,
+                    'convert.errors' : 1, 'expand.calls' : 1,
+                    'expand.items' : 3, 'expand.errors' : 0}
+        for (k, v) in expected.items():
+            self.assertEqual(stats[k], v, f'wrong {k}')
+        self.assertGreaterEqual(stats['book_lookup.calls'], 4,
+                                'book lookups not counted')
+        self.assertGreater(stats['parse.seconds'], 0, 'parse not timed')
+        self.assertEqual(get_stats()['parse.calls'], 6, 'wrong totals')
+        self.assertFalse(enable_stats(), 'wrongly enabled')
+        self.assertTrue(enable_stats(False), 'not enabled')
+        reset_stats()
+        self.assertEqual(set(get_stats().values()), {0}, 'not reset')
+
+    def testBookAbbreviations(self):
+        self.assertEqual(BookID.abbreviations(BookID._MATTHEW), ('Matt', 'Mt'),
+                         'wrong abbreviations')
+        for (name, book_id) in BookID._map.items():
+            for a in BookID.abbreviations(book_id):
+                self.assertEqual(BookID.fromStr(a), book_id,
+                                 f'{a} does not resolve to {name}')
+        self.assertEqual(parse_refs('Jn 3:16', ReferenceFormID.BIBLEUTILS)[0]
+                         .st_book, BookID._JOHN, 'abbreviation not parsed')
+
+    def testFormatRefsRoundTrip(self):
+        B = ReferenceFormID.BIBLEUTILS
+        refs = [r for s in ('Gen 1:1-3', 'Gen 1:5', 'Gen 2:4', 'Exod 3-5',
+                            'Lev 1', '1Sam 2:1', 'Ruth 1:2-4', 'Ruth 2')
+                for r in parse_refs(s, B)]
+        s = format_refs(refs)
+        self.assertEqual(parse_refs(s, B), refs,
+                         f'compact string {s} not read back')
+        for form in (B, ReferenceFormID.ETCBCG, ReferenceFormID.ETCBCH):
+            names = bibleutils.versification._form_book_names
+            get_versification(form) if form != B else None
+            books = [b for (b, n) in zip(names[B], names[form])
+                     if b and n is not None]
+            refs = [r for b in books
+                    for r in (Ref(B, b, None, 2, None, 3, 5), Ref(B, b, None, 4))]
+            for style in ('compact', 'separate'):
+                s = format_refs(refs, form, style)
+                self.assertEqual(parse_refs(s, form), refs,
+                                 f'{style} string in form {form} not read back')
+        self.assertEqual(parse_refs('Gen 1:1; Exod 2; 3:4',
+                                    ReferenceFormID.BIBLEUTILS),
+                         [Ref(ReferenceFormID.BIBLEUTILS, BookID._GENESIS,
+                              None, 1, None, 1),
+                          Ref(ReferenceFormID.BIBLEUTILS, BookID._EXODUS,
+                              None, 2),
+                          Ref(ReferenceFormID.BIBLEUTILS, BookID._EXODUS,
+                              None, 3, None, 4)], 'wrong refs of groups')
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
\ No newline at end of file
@@ -13,6 +13,12 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/47rooks/bible-utilities",
     packages=setuptools.find_packages(),
+    extras_require={
+        "arrays": ["numpy"],
+    },
+    entry_points={
+        "console_scripts": ["bibleutils = bibleutils.cli:main"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",